@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from aiohttp import web
+
+'''Fake Node Pin Counts'''
+AI_PINS = 8
+DI_PINS = 8
+AO_PINS = 2
+DO_PINS = 8
+
+'''Fake DAQ Node Class'''
+class fake_node:
+    '''Stand-in for the node API on port 8000, every loopback address it listens on acts as a separate node'''
+    def __init__(self, latency=0.005, jitter=0.002, error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.outputs = {}
+        self.requests = 0
+        self.app = web.Application()
+        self.app.add_routes([
+            web.get('/analog/input', self.analog_input),
+            web.get('/digital/input', self.digital_input),
+            web.get('/digital_output/input', self.digital_output_input),
+            web.post('/analog/output', self.analog_output),
+            web.post('/digital/output', self.digital_output),
+            web.get('/stream', self.stream),
+        ])
+        self.streams = 0
+
+    '''Simulated Delay Function'''
+    async def delay(self):
+        self.requests += 1
+        await asyncio.sleep(max(random.gauss(self.latency, self.jitter), 0))
+        return random.random() >= self.error_rate
+
+    '''Node State Function'''
+    def state(self, request):
+        host = request.host.split(':')[0]
+        if host not in self.outputs:
+            self.outputs[host] = {'ao': [0.0] * AO_PINS, 'do': [0] * DO_PINS}
+        return self.outputs[host]
+
+    '''Pin Response Function'''
+    def pins(self, values):
+        return web.json_response({'success': True, 'data': [{'pin': i, 'value': v} for i, v in enumerate(values)]})
+
+    '''Error Response Function'''
+    def error(self):
+        return web.json_response({'success': False, 'data': ['Simulated node error']})
+
+    async def analog_input(self, request):
+        if not await self.delay():
+            return self.error()
+        return self.pins([round(random.uniform(0, 5), 3) for _ in range(AI_PINS)])
+
+    async def digital_input(self, request):
+        if not await self.delay():
+            return self.error()
+        return self.pins([random.randint(0, 1) for _ in range(DI_PINS)])
+
+    async def digital_output_input(self, request):
+        if not await self.delay():
+            return self.error()
+        return self.pins(self.state(request)['do'])
+
+    async def analog_output(self, request):
+        if not await self.delay():
+            return self.error()
+        self.state(request)['ao'] = (await request.json())['value']
+        return web.json_response({'success': True, 'data': ['OK']})
+
+    async def digital_output(self, request):
+        if not await self.delay():
+            return self.error()
+        self.state(request)['do'] = (await request.json())['value']
+        return web.json_response({'success': True, 'data': ['OK']})
+
+    async def stream(self, request):
+        '''WebSocket sending one newline-delimited JSON frame of every requested endpoint per tick'''
+        endpoints = request.query.get('endpoints', '/analog/input').split(',')
+        period = 1 / float(request.query.get('rate', 10))
+        readers = {
+            '/analog/input': lambda: [round(random.uniform(0, 5), 3) for _ in range(AI_PINS)],
+            '/digital/input': lambda: [random.randint(0, 1) for _ in range(DI_PINS)],
+            '/digital_output/input': lambda: list(self.state(request)['do']),
+        }
+        ws = web.WebSocketResponse(heartbeat=15)
+        await ws.prepare(request)
+        self.streams += 1
+        sender = asyncio.ensure_future(self.send_frames(ws, endpoints, readers, period))
+        async for _ in ws:
+            pass
+        sender.cancel()
+        return ws
+
+    async def send_frames(self, ws, endpoints, readers, period):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        try:
+            while not ws.closed:
+                frame = {'t': time.time_ns(), 'data': {e: readers[e]() for e in endpoints if e in readers}}
+                await ws.send_str(json.dumps(frame) + '\n')
+                next_tick += period
+                await asyncio.sleep(max(next_tick - loop.time(), 0))
+        except ConnectionResetError:
+            pass
+
+'''Fake ZeroTier Central Class'''
+class fake_zerotier:
+    '''Stand-in for the ZeroTier Central member API with N members on 127.0.0.x addresses'''
+    def __init__(self, members=30, latency=0.05, jitter=0.01, churn=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.churn = churn
+        self.requests = 0
+        self.not_modified = 0
+        self.members = {}
+        for i in range(members):
+            node_id = '{:010x}'.format(0xa000000000 + i)
+            self.members[node_id] = {
+                'nodeId': node_id,
+                'name': 'node-{:03d}'.format(i),
+                'lastSeen': int(time.time() * 1000),
+                'config': {'authorized': True, 'ipAssignments': ['127.0.{}.{}'.format(1 + i // 250, 1 + i % 250)]},
+            }
+        self.app = web.Application()
+        self.app.add_routes([
+            web.get('/api/v1/network/{net_id}/member', self.member_list),
+            web.get('/api/v1/network/{net_id}/member/{node_id}', self.member),
+            web.post('/api/v1/network/{net_id}/member/{node_id}', self.update_member),
+        ])
+
+    '''Member Churn Function'''
+    def step(self):
+        '''Refresh lastSeen of every member, churn members drop offline'''
+        now = int(time.time() * 1000)
+        offline = set(random.sample(sorted(self.members), min(self.churn, len(self.members))))
+        for node_id, member in self.members.items():
+            member['lastSeen'] = now - 120000 if node_id in offline else now
+
+    async def member_list(self, request):
+        self.requests += 1
+        await asyncio.sleep(max(random.gauss(self.latency, self.jitter), 0))
+        if self.churn:
+            self.step()
+        body = json.dumps(list(self.members.values()))
+        etag = '"' + hashlib.md5(body.encode('utf-8')).hexdigest() + '"'
+        if request.headers.get('If-None-Match') == etag:
+            self.not_modified += 1
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(text=body, content_type='application/json', headers={'ETag': etag})
+
+    async def member(self, request):
+        self.requests += 1
+        node_id = request.match_info['node_id']
+        if node_id not in self.members:
+            return web.json_response({'config': {'authorized': False, 'ipAssignments': []}})
+        return web.json_response(self.members[node_id])
+
+    async def update_member(self, request):
+        self.requests += 1
+        node_id = request.match_info['node_id']
+        update = await request.json()
+        member = self.members.setdefault(node_id, {
+            'nodeId': node_id,
+            'name': '',
+            'lastSeen': int(time.time() * 1000),
+            'config': {'authorized': False, 'ipAssignments': ['127.0.9.{}'.format(1 + len(self.members) % 250)]},
+        })
+        member['name'] = update.get('name', member['name'])
+        member['config'].update(update.get('config', {}))
+        return web.json_response(member)
+
+'''Server Thread Class'''
+class server_thread:
+    '''Serves aiohttp apps from a private event loop thread so benchmarks can drive them synchronously'''
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.runners = []
+        self.thread = threading.Thread(target=self.loop.run_forever, name='Benchmark_Servers', daemon=True)
+        self.thread.start()
+
+    '''Serve App Function'''
+    def serve(self, app, hosts, port):
+        async def start():
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            for host in hosts:
+                await web.TCPSite(runner, host, port).start()
+            self.runners.append(runner)
+        asyncio.run_coroutine_threadsafe(start(), self.loop).result()
+
+    '''Stop Servers Function'''
+    def stop(self):
+        async def cleanup():
+            for runner in self.runners:
+                await runner.cleanup()
+        asyncio.run_coroutine_threadsafe(cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
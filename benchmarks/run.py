@@ -0,0 +1,278 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import remoteDAQ_Acquisition
+import remoteDAQ_Buffer
+import remoteDAQ_Cache
+import remoteDAQ_Chart
+import remoteDAQ_Client
+import remoteDAQ_Output
+import remoteDAQ_Store
+import remoteDAQ_Table
+from fake_servers import fake_node, fake_zerotier, server_thread
+
+'''Node Endpoints'''
+INPUT_ENDPOINTS = ['/analog/input', '/digital/input', '/digital_output/input']
+NODE_PORT = 8000
+ZT_PORT = 9993
+ZT_NET_ID = 'bench00000000000'
+
+'''Percentiles Function'''
+def percentiles(samples, scale=1000):
+    '''Summarise seconds as milliseconds'''
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    return {
+        'count': len(samples),
+        'mean': statistics.fmean(samples) * scale,
+        'p50': samples[len(samples) // 2] * scale,
+        'p95': samples[int(len(samples) * 0.95)] * scale,
+        'p99': samples[int(len(samples) * 0.99)] * scale,
+        'max': samples[-1] * scale,
+    }
+
+'''Node Addresses Function'''
+def node_addresses(count):
+    return {'node-{:03d}'.format(i): '127.0.{}.{}'.format(1 + i // 250, 1 + i % 250) for i in range(count)}
+
+'''Single Call Latency Scenario'''
+def single_call_latency(client, requests):
+    nodes = node_addresses(1)
+    node_ip = nodes['node-000']
+    results = {}
+    for endpoint in INPUT_ENDPOINTS:
+        samples = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            client.request(remoteDAQ_Acquisition.node_url(node_ip, endpoint))
+            samples.append(time.perf_counter() - start)
+        results[endpoint] = percentiles(samples)
+    for endpoint, value in ((remoteDAQ_Output.AO_ENDPOINT, [2.5, 0.0]), (remoteDAQ_Output.DO_ENDPOINT, [1, 0] * 4)):
+        samples = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            client.request(remoteDAQ_Acquisition.node_url(node_ip, endpoint), payload={'value': value})
+            samples.append(time.perf_counter() - start)
+        results[endpoint] = percentiles(samples)
+    return results
+
+'''Fan-Out Throughput Scenario'''
+def fanout_throughput(client, node_counts, rounds, concurrency):
+    results = {}
+    for count in node_counts:
+        nodes = node_addresses(count)
+        reads, writes = [], []
+        failed = 0
+        for _ in range(rounds):
+            start = time.perf_counter()
+            read = remoteDAQ_Acquisition.read_all(nodes, '/analog/input', concurrency=concurrency, client=client)
+            reads.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            acks = remoteDAQ_Output.set_all(nodes, remoteDAQ_Output.output_state(ao=[1.0, 2.0], do=[1, 0] * 4), concurrency=concurrency, client=client)
+            writes.append(time.perf_counter() - start)
+            failed += sum(1 for r in list(read.values()) + list(acks.values()) if r['success'] != True)
+        results[str(count)] = {
+            'read_ms': percentiles(reads),
+            'read_nodes_per_s': count / statistics.fmean(reads),
+            'write_verify_ms': percentiles(writes),
+            'write_nodes_per_s': count / statistics.fmean(writes),
+            'failed': failed,
+        }
+    return results
+
+'''Poller Load Scenario'''
+def poller_load(client, zerotier, session_counts, duration, ttl):
+    results = {}
+    for sessions in session_counts:
+        cache = remoteDAQ_Cache.member_cache(ZT_NET_ID, 'bench', ttl=ttl, client=client, api_url='http://127.0.0.1:{}/api/v1'.format(ZT_PORT))
+        callbacks = []
+        views = [dict() for _ in range(sessions)]
+
+        def listener(view):
+            def changed(added, removed):
+                start = time.perf_counter()
+                for k in removed:
+                    view.pop(k, None)
+                view.update(added)
+                callbacks.append(time.perf_counter() - start)
+            return changed
+
+        for i, view in enumerate(views):
+            view.update(cache.presence.subscribe(i, listener(view)))
+        refreshes = []
+        requests = zerotier.requests
+        cpu = time.process_time()
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            start = time.perf_counter()
+            cache.presence.update(cache.refresh(force=True))
+            refreshes.append(time.perf_counter() - start)
+            time.sleep(ttl)
+        results[str(sessions)] = {
+            'zt_requests_per_s': (zerotier.requests - requests) / duration,
+            'refresh_ms': percentiles(refreshes),
+            'session_callback_ms': percentiles(callbacks),
+            'cpu_s_per_s': (time.process_time() - cpu) / duration,
+            'online': cache.presence.stats()['online'],
+        }
+    return results
+
+'''Continuous Acquisition Scenario'''
+def acquisition_transport(client, node, rate, duration):
+    '''Achieved sample rate and node request count of polling versus streaming one node into a sample store, as the dashboard does'''
+    node_ip = node_addresses(1)['node-000']
+    results = {}
+    for transport in ('poll', 'auto'):
+        requests = node.requests
+        with tempfile.TemporaryDirectory() as root:
+            store = remoteDAQ_Store.sample_store(root=root, capacity=rate * int(duration + 1) * 2)
+            job = remoteDAQ_Acquisition.acquisition(node_ip, INPUT_ENDPOINTS, lambda frame: None, sample_rate=rate, node_name='node-000', writer=store, client=client, transport=transport)
+            job.start()
+            time.sleep(duration)
+            job.stop()
+            stored = store.stats()['samples_written']
+            store.close()
+        stats = job.stats()
+        results['stream' if transport == 'auto' else transport] = {
+            'achieved_rate': stats['achieved_rate'],
+            'errors': stats['errors'],
+            'overruns': stats['overruns'],
+            'reconnects': stats['reconnects'],
+            'transport': stats['transport'],
+            'samples_stored': stored,
+            'node_requests_per_s': (node.requests - requests) / duration,
+        }
+    return results
+
+'''UI Update Cost Scenario'''
+def ui_update_cost(client, node_counts, rounds, chart_rate, churn):
+    '''status_table.sync() on a member list where a churn fraction of nodes flip online state and name each round'''
+    results = {}
+    for count in node_counts:
+        now = int(time.time() * 1000)
+        members = [{
+            'nodeId': '{:010x}'.format(i),
+            'name': 'node-{:03d}'.format(i),
+            'lastSeen': now,
+            'config': {'ipAssignments': ['127.0.0.1'], 'authorized': True},
+        } for i in range(count)]
+        table = remoteDAQ_Table.status_table(client)
+        start = time.perf_counter()
+        table.sync(members)
+        results['status_first_sync_{}_ms'.format(count)] = (time.perf_counter() - start) * 1000
+        changed = int(round(count * churn))
+        samples = []
+        for r in range(rounds):
+            for j in range(changed):
+                m = members[(r * changed + j) % count]
+                m['lastSeen'] = now - 3600 * 1000 if m['lastSeen'] == now else now
+                m['name'] = m['name'].rstrip('*') if m['name'].endswith('*') else m['name'] + '*'
+            start = time.perf_counter()
+            table.sync(members)
+            samples.append(time.perf_counter() - start)
+        results['status_sync_{}'.format(count)] = dict(percentiles(samples), changed_rows=changed)
+
+    buffer = remoteDAQ_Buffer.sample_buffer(max_samples=chart_rate * 3600)
+    response = {'success': True, 'data': [{'value': 2.5} for _ in range(8)]}
+    samples = []
+    for _ in range(rounds * 100):
+        start = time.perf_counter()
+        buffer.append_response(response)
+        [buffer.latest(pin) for pin in range(8)]
+        samples.append(time.perf_counter() - start)
+    results['buffer_append_latest'] = percentiles(samples)
+
+    now = time.time_ns()
+    with buffer.lock:
+        buffer.trim(0)
+        period = 10**9 // chart_rate
+        for i in range(chart_rate * 3600):
+            buffer.append_row(now - (chart_rate * 3600 - i) * period, [2.5 + (i % 100) / 100] * 8)
+    decimator = remoteDAQ_Chart.chart_decimator(buffer)
+    start = time.perf_counter()
+    for pin in range(8):
+        decimator.series(pin, 3600 * 10**9, now)
+    results['chart_first_build_8ch_ms'] = (time.perf_counter() - start) * 1000
+    samples = []
+    for i in range(rounds):
+        buffer.append(now + (i + 1) * period, [2.5] * 8)
+        start = time.perf_counter()
+        series = {pin: decimator.series(pin, 3600 * 10**9, now + (i + 1) * period) for pin in range(8)}
+        remoteDAQ_Chart.svg_base64(remoteDAQ_Chart.svg_chart(series, now - 3600 * 10**9, now))
+        samples.append(time.perf_counter() - start)
+    results['chart_refresh_8ch_1h'] = percentiles(samples)
+    return results
+
+'''Benchmark Main Function'''
+def main():
+    parser = argparse.ArgumentParser(description='RemoteDAQ-Server benchmarks against a local fake node and fake ZeroTier API')
+    parser.add_argument('--latency', type=float, default=5, help='fake node latency in ms')
+    parser.add_argument('--jitter', type=float, default=2, help='fake node latency jitter in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of node requests that fail')
+    parser.add_argument('--zt-latency', type=float, default=50, help='fake ZeroTier latency in ms')
+    parser.add_argument('--members', type=int, default=30, help='fake ZeroTier member count')
+    parser.add_argument('--churn', type=int, default=1, help='members dropping offline on each ZeroTier poll')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint for single-call latency')
+    parser.add_argument('--nodes', type=int, nargs='+', default=[1, 10, 30, 100], help='node counts for fan-out and UI scenarios')
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 10, 50, 100], help='session counts for poller load')
+    parser.add_argument('--rounds', type=int, default=20, help='rounds per fan-out and UI measurement')
+    parser.add_argument('--concurrency', type=int, default=16, help='fan-out concurrency')
+    parser.add_argument('--poll-duration', type=float, default=5, help='seconds of polling per session count')
+    parser.add_argument('--poll-ttl', type=float, default=0.5, help='seconds between ZeroTier polls')
+    parser.add_argument('--acq-rate', type=int, default=50, help='continuous acquisition sample rate for the transport comparison')
+    parser.add_argument('--acq-duration', type=float, default=5, help='seconds of continuous acquisition per transport')
+    parser.add_argument('--ui-churn', type=float, default=0.1, help='fraction of status table nodes changing on each sync')
+    parser.add_argument('--chart-rate', type=int, default=100, help='samples per second held in the 1 hour chart buffer')
+    parser.add_argument('--scenarios', nargs='+', default=['latency', 'fanout', 'poller', 'acquisition', 'ui'])
+    parser.add_argument('--output', default=None, help='result file, defaults to benchmarks/results/<timestamp>.json')
+    args = parser.parse_args()
+
+    node = fake_node(args.latency / 1000, args.jitter / 1000, args.error_rate)
+    zerotier = fake_zerotier(args.members, args.zt_latency / 1000, churn=args.churn)
+    servers = server_thread()
+    servers.serve(node.app, sorted(set(node_addresses(max(args.nodes)).values())), NODE_PORT)
+    servers.serve(zerotier.app, ['127.0.0.1'], ZT_PORT)
+    client = remoteDAQ_Client.api_client(limit_per_host=args.concurrency)
+
+    scenarios = {}
+    try:
+        if 'latency' in args.scenarios:
+            scenarios['single_call_latency'] = single_call_latency(client, args.requests)
+        if 'fanout' in args.scenarios:
+            scenarios['fanout_throughput'] = fanout_throughput(client, args.nodes, args.rounds, args.concurrency)
+        if 'poller' in args.scenarios:
+            scenarios['poller_load'] = poller_load(client, zerotier, args.sessions, args.poll_duration, args.poll_ttl)
+        if 'acquisition' in args.scenarios:
+            scenarios['acquisition_transport'] = acquisition_transport(client, node, args.acq_rate, args.acq_duration)
+        if 'ui' in args.scenarios:
+            scenarios['ui_update_cost'] = ui_update_cost(client, args.nodes, args.rounds, args.chart_rate, args.ui_churn)
+    finally:
+        client.close()
+        servers.stop()
+
+    report = {
+        'started': datetime.datetime.now().isoformat(timespec='seconds'),
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'config': vars(args),
+        'node_requests': node.requests,
+        'scenarios': scenarios,
+    }
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', datetime.datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(scenarios, indent=2))
+    print('Results saved to ' + output)
+
+if __name__ == '__main__':
+    main()
@@ -1,70 +1,71 @@
 import flet as ft
-import aiohttp
-import json
-import datetime
-import asyncio
+import sys
+import time
 from os import getenv
 from dotenv import load_dotenv
-from apscheduler.schedulers.background import BackgroundScheduler
-import paramiko
-import scp
 import remoteDAQ_Logger
+import remoteDAQ_Client
+import remoteDAQ_Cache
+import remoteDAQ_Scheduler
+import remoteDAQ_Acquisition
+import remoteDAQ_Ingest
+import remoteDAQ_Provision
+import remoteDAQ_SSH
+import remoteDAQ_Store
+import remoteDAQ_Buffer
+import remoteDAQ_Chart
+import remoteDAQ_Output
+import remoteDAQ_Sequence
+import remoteDAQ_Metrics
+import remoteDAQ_History
+import remoteDAQ_State
+import remoteDAQ_Workers
+from remoteDAQ_Table import result_table, status_table
+from urllib.parse import urlparse
 import threading
-from re import search
 
 '''Logger Config'''
 my_logger = remoteDAQ_Logger.get_logger('RemoteDAQ_Server')
 
-'''API Requests Function'''
-async def api_request(url, payload={}, headers={}) -> dict:
-    headers['Content-Type'] = 'application/json'
-    try:
-        timeout = aiohttp.ClientTimeout(total=30)
-        async with aiohttp.ClientSession(headers=headers, timeout=timeout) as session:
-            if payload:
-                value = json.dumps(payload)
-                async with session.post(url, data=value) as response:
-                    return await response.json()
-            else:
-                async with session.get(url) as response:
-                    return await response.json()
-    except aiohttp.ClientConnectorError:
-        my_logger.error('### Failed to Connect ###')
-        return {'success':False, 'data':['Connection refused, check connection']}
-    except aiohttp.ContentTypeError:
-        my_logger.error('### Return Type Error ###')
-        return {'success':False, 'data':['Invalid token or network ID, please check again']}
-    except Exception as e:
-        my_logger.error('### Unexpected RemoteDAQ API Call Error Occured ###')
-        my_logger.error(e)
-        return {'success':False, 'data':['Unexpected error, Error message: ' + str(e)]}
-
-'''SSH Function'''
-def ssh_client(host, username, password, command='', file='', port=22):
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    try:
-        ssh.connect(host, port, username, password, timeout=3)
-    except Exception as e:
-        my_logger.error('### Unexpected SSH Error Occured ###')
-        my_logger.error(e)
-    if file:
-        try:
-            with scp.SCPClient(ssh.get_transport()) as scp_client:
-                scp_client.put(file, 'RemoteDAQ/' + file)
-        except Exception as e:
-            my_logger.error('### Unexpected SCP Error Occured ###')
-            my_logger.error(e)
-        return 'OK'
-    elif command:
-        stdin, stdout, stderr = ssh.exec_command(command)
-        err_out = stderr.read().decode('utf-8')
-        if err_out:
-            my_logger.error('### Unexpected SSH Command Error Occured ###')
-            my_logger.error(err_out)
-            return 'ERR'
-        if stdout.read().decode('utf-8'):
-            return 'OK'
+'''Load Variables'''
+load_dotenv()
+
+'''Worker Supervisor'''
+if __name__ == '__main__' and remoteDAQ_Workers.supervisor_mode():
+    sys.exit(remoteDAQ_Workers.supervise())
+
+'''Shared API Client'''
+api = remoteDAQ_Client.get_client()
+
+'''Metrics and Export Endpoint'''
+metrics = remoteDAQ_Metrics.get_registry()
+server = remoteDAQ_Metrics.get_server(api)
+history = remoteDAQ_History.get_history()
+history.register(server.app)
+server.start()
+active_sessions = set()
+metrics.collector(lambda: [('remotedaq_sessions_active', 'Connected dashboard sessions', {}, len(active_sessions))])
+
+'''Shared State Backend'''
+shared_state = remoteDAQ_State.get_state()
+leader = remoteDAQ_State.get_leader()
+
+'''Shared ZeroTier Member Cache'''
+zt_members = remoteDAQ_Cache.get_member_cache()
+
+'''Shared Scheduler'''
+scheduler = remoteDAQ_Scheduler.get_scheduler()
+scheduler.add_job('status_table', seconds=5)
+scheduler.add_job('server_health', seconds=5)
+
+'''Shared InfluxDB Writer'''
+influx = remoteDAQ_Ingest.get_writer()
+
+'''Shared Sample Store'''
+samples = remoteDAQ_Store.get_store(influx)
+
+'''Shared Provisioning Queue'''
+provisioning = remoteDAQ_Provision.get_queue(remoteDAQ_SSH.ssh_client)
 
 '''Card Class'''
 class card(ft.UserControl):
@@ -88,35 +89,6 @@ class card(ft.UserControl):
             width=self.width,
         )
 
-'''Result Table Class'''
-class result_table(ft.DataTable):
-    def __init__(self, row_headers=0, col_headers=['Pin', 'Value']):
-        self.col_headers = col_headers
-        self.row_headers = row_headers
-        super().__init__(
-            border=ft.border.all(1, ft.colors.BLACK),
-            border_radius=10,
-            vertical_lines=ft.border.BorderSide(1, ft.colors.BLACK),
-            horizontal_lines=ft.border.BorderSide(1, ft.colors.BLACK38),
-            show_checkbox_column=True,
-            columns=[
-                ft.DataColumn(ft.Text(i)) for i in self.col_headers
-            ],
-            rows=[
-                ft.DataRow(
-                    [ft.DataCell(ft.Text('')) for _ in range(len(self.col_headers))],
-                    on_select_changed=self.cell_selected,
-                ) for _ in range(0, self.row_headers)
-            ]
-        )
-        for i in range(0, self.row_headers):
-            self.rows[i].cells[0].content.value = str(i)
-
-    '''Result Table Checkbox Function'''
-    def cell_selected(self, e):
-        e.control.selected = not e.control.selected
-        self.update()
-
 '''Banner Class'''
 class banner(ft.Banner):
     def __init__(self, content, bgcolor=ft.colors.RED, *args, **kwargs):
@@ -146,84 +118,45 @@ def main(page: ft.Page):
     page.theme_mode = ft.ThemeMode.LIGHT
     page.theme = theme
     page.title = 'Universal Remote Data Acquisition Dashboard'
-    nav = ['/', '/status', '/about']
+    nav = ['/', '/status', '/provision', '/history', '/health', '/about']
     
-    '''Load Variables'''
-    load_dotenv()
-    zt_id = str(getenv('ZT_ID'))
-    zt_net_id = str(getenv('ZT_NET_ID'))
-    zt_token = str(getenv('ZT_TOKEN'))
-
     '''Result Table Instance'''
     ai_result_table =  result_table(8)
     di_result_table = result_table(8)
     doi_result_table = result_table(8)
-    node_result_table = result_table(col_headers=['ID', 'Name', 'IP Address', 'Authorized', 'Online'])
+    node_result_table = status_table(api)
+    all_nodes_result_table = result_table(col_headers=['Node', 'Pin', 'Value'])
+    provision_result_table = result_table(col_headers=['ID', 'Name', 'IP Address', 'State', 'Message'])
+    health_result_table = result_table(col_headers=['Metric', 'Labels', 'Value'])
 
     '''Dropdown Instance'''
     node_dropdown = ft.Dropdown(
         label='Universal Remote Data Acquisition Node',
     )
 
-    '''Get Node List Function'''
-    def get_node_list():
-        result = []
-        if zt_net_id and zt_token:
-            url = 'https://api.zerotier.com/api/v1/network/' + zt_net_id + '/member'
-            headers = {'Authorization' : 'Bearer ' + zt_token}
-            try:
-                result = asyncio.run(api_request(url, headers=headers))
-            except TypeError:
-                pass
-            except Exception as e:
-                my_logger.error('### Unexpected API Call Error Occured ###')
-                my_logger.error(e)
-        result = [r for r in result if search('node', r['name'])]
-        return result
-    
-    '''Check ZeroTier Node Status Function'''
-    def isOnline(timestamp):
-        lastSeen = datetime.datetime.fromtimestamp(timestamp/1000)
-        now = datetime.datetime.now()
-        delta = now - lastSeen
-        if delta.seconds < 90:
-            return True
-        return False
-    
     '''Update Node Dropdown Function'''
-    def update_node_dropdown():
+    node_options = {}
+    def update_node_dropdown(added, removed):
+        for node in removed:
+            option = node_options.pop(node, None)
+            if option:
+                node_dropdown.options.remove(option)
+                if node_dropdown.value == option.key:
+                    node_dropdown.value = None
+        for node, label in added.items():
+            if node in node_options:
+                node_options[node].key = label
+            else:
+                node_options[node] = ft.dropdown.Option(label)
+                node_dropdown.options.append(node_options[node])
         if page.route == '/':
-            new_node_list = ['{} | {}'.format(r['name'], r['config']['ipAssignments'][0]) for r in get_node_list() if isOnline(r['lastSeen']) and r['config']['ipAssignments']]
-            node_dropdown.options.clear()
-            for node in new_node_list:
-                node_dropdown.options.append(ft.dropdown.Option(node))
-            page.update()
+            node_dropdown.update()
     
     '''Update Node Status Table Function'''
     def update_status_table():
         if page.route == '/status':
-            new_node_list = get_node_list()
-            node_result_table.rows.clear()
-            for n in new_node_list:
-                node_ip = n['config']['ipAssignments'][0] if n['config']['ipAssignments'] else ''
-                node_result_table.rows.append(
-                    ft.DataRow(
-                        [
-                            ft.DataCell(ft.Text(n['nodeId'], selectable=True)),
-                            ft.DataCell(ft.Text(n['name'], selectable=True)),
-                            ft.DataCell(ft.Text(node_ip, selectable=True)),
-                            ft.DataCell(
-                                ft.Container(ft.Icon(ft.icons.CHECK_CIRCLE, color=ft.colors.GREEN), alignment=ft.alignment.center))
-                                if n['config']['authorized']
-                                else ft.DataCell(ft.Container(ft.Icon(ft.icons.ERROR, color=ft.colors.RED), alignment=ft.alignment.center)),
-                            ft.DataCell(
-                                ft.Container(ft.Icon(ft.icons.CHECK_CIRCLE, color=ft.colors.GREEN), alignment=ft.alignment.center))
-                                if isOnline(n['lastSeen'])
-                                else ft.DataCell(ft.Container(ft.Icon(ft.icons.ERROR, color=ft.colors.RED), alignment=ft.alignment.center)),
-                        ]
-                    )
-                )
-            node_result_table.update()
+            if node_result_table.sync(zt_members.get_members()):
+                node_result_table.update()
 
     '''Add Node Function'''
     def add_node(e):
@@ -234,56 +167,69 @@ def main(page: ft.Page):
         ssh_user = ft.TextField(label='SSH Username')
         ssh_pass = ft.TextField(label='SSH Password', password=True, can_reveal_password=True)
         ssh_root_pass = ft.TextField(label='SSH Root Password', password=True, can_reveal_password=True)
+        output_view = ft.ListView(height=120, spacing=0, auto_scroll=True)
+
+        dialog_key = (page.session_id, 'add_node')
 
         def close_dialog(e):
+            provisioning.unsubscribe(dialog_key)
             dialog.open = False
             page.update()
 
+        def set_busy(busy):
+            pb.visible = busy
+            node_id.disabled = busy
+            node_name.disabled = busy
+            ssh_user.disabled = busy
+            ssh_pass.disabled = busy
+            ssh_root_pass.disabled = busy
+            apply_button.disabled = busy
+
+        def job_changed(job):
+            if job['node_id'] != node_id.value:
+                return
+            if job['state'] == 'done':
+                result_text.value = 'OK'
+                result_text.color = ft.colors.GREEN
+            elif job['state'] == 'failed':
+                result_text.value = 'ERR: ' + job['message']
+                result_text.color = ft.colors.RED
+            else:
+                result_text.value = job['message'] or job['state'].replace('_', ' ').capitalize() + '...'
+            if job['state'] in remoteDAQ_Provision.FINISHED:
+                provisioning.unsubscribe(dialog_key)
+                set_busy(False)
+            page.update()
+
+        def output_received(node, line):
+            if node != node_id.value:
+                return
+            output_view.controls.append(ft.Text(line, size=11, selectable=True))
+            if len(output_view.controls) > 200:
+                output_view.controls.pop(0)
+            output_view.update()
+
         def execute(e):
             result_text.value = "Loading..."
             result_text.color = ft.colors.BLACK
-            pb.visible = True
-            node_id.disabled = True
-            node_name.disabled = True
-            ssh_user.disabled = True
-            ssh_pass.disabled = True
-            ssh_root_pass.disabled = True
-            cancel_button.disabled = True
-            apply_button.disabled = True
-
-            zt_url = 'https://api.zerotier.com/api/v1/network/' + zt_net_id + '/member/' + str(node_id.value)
-            headers = {'Authorization' : 'Bearer ' + zt_token}
-            auth_result = asyncio.run(api_request(zt_url, payload={'name': node_name.value, 'config': {'authorized': True}}, headers=headers))
-            
-            if auth_result['config']['authorized']:
-                ip_result = asyncio.run(api_request(zt_url, headers=headers))
-                node_ip = ip_result['config']['ipAssignments'][0]
-                scp_result = ssh_client(host=node_ip,
-                            username=ssh_user.value,
-                            password=ssh_pass.value,
-                            file='.env-node'
-                            )
-                if scp_result:
-                    ssh_result = ssh_client(host=node_ip,
-                                username='root',
-                                password=ssh_root_pass.value,
-                                command=f'bash -c "cd /home/{ssh_user.value}/RemoteDAQ; ansible-playbook remotedaq_node_setup.yml -i inventory"'
-                                )
-                    if ssh_result:
-                        result_text.value = ssh_result
-                        if ssh_result == 'ERR':
-                            result_text.color = ft.colors.RED
-                        if ssh_result == 'OK':
-                            result_text.color = ft.colors.GREEN
-                        pb.visible = False
-                        node_id.disabled = False
-                        node_name.disabled = False
-                        ssh_user.disabled = False
-                        ssh_pass.disabled = False
-                        ssh_root_pass.disabled = False
-                        cancel_button.disabled = False
-                        apply_button.disabled = False
-                
+            set_busy(True)
+            output_view.controls.clear()
+            provisioning.subscribe(dialog_key, job_changed)
+            provisioning.subscribe_output(dialog_key, output_received)
+            queued = provisioning.submit([{
+                'node_id': str(node_id.value),
+                'name': node_name.value,
+                'ssh_user': ssh_user.value,
+                'ssh_pass': ssh_pass.value,
+                'root_pass': ssh_root_pass.value,
+            }])
+            if not queued:
+                provisioning.unsubscribe(dialog_key)
+                result_text.value = 'Node is already being provisioned'
+                result_text.color = ft.colors.RED
+                set_busy(False)
+            page.update()
+
         cancel_button = ft.TextButton('Cancel', on_click=close_dialog)
         apply_button = ft.FilledButton('Apply', on_click=execute)
         
@@ -297,8 +243,9 @@ def main(page: ft.Page):
                     ssh_pass,
                     ssh_root_pass,
                     pb,
+                    output_view,
                 ],
-                height=400
+                height=520
             ),
             actions=[result_text, cancel_button, apply_button],
             actions_alignment=ft.MainAxisAlignment.END,
@@ -309,12 +256,11 @@ def main(page: ft.Page):
         page.update()
 
     '''Parse Data Function'''
-    def parse_data(api_response, output_table):
+    def parse_data(buffer, output_table):
         for row in output_table.rows:
             if row.selected:
                 sel_pin = int(row.cells[0].content.value)
-                pin = api_response['data'][sel_pin]
-                row.cells[1].content.value = pin['value']
+                row.cells[1].content.value = buffer.latest(sel_pin)
             else:
                 row.cells[1].content.value = ''
         output_table.update()
@@ -326,55 +272,197 @@ def main(page: ft.Page):
             row.cells[1].content.value = ''
         output_table.update()
     
+    '''In-Flight Request Tracking'''
+    session_requests = set()
+    def track_request(request_id):
+        session_requests.intersection_update(list(api.pending))
+        session_requests.add(request_id)
+
+    '''Cancel Requests Function'''
+    def cancel_requests(e=None):
+        '''Cancel this session's in-flight reads, writes and All Nodes fan-out, their callbacks never run'''
+        cancelled = len([request_id for request_id in list(session_requests) if api.cancel(request_id)])
+        session_requests.clear()
+        if e is not None:
+            all_nodes_pb.visible = False
+            page.banner = banner('Cancelled {} request(s)'.format(cancelled), bgcolor=ft.colors.GREEN if cancelled else ft.colors.RED)
+            page.update()
+
     '''DAQ Function'''
     def daq(endpoint, result_table=None, daq_pin_values=None):
         selected_node = str(node_dropdown.value).split(' | ')[1] if node_dropdown.value else ''
         url = 'http://' + selected_node + ':8000' + endpoint
+        deadline = float(getenv('DAQ_DEADLINE', 10))
         if selected_node:
             if result_table:
                 daq_pins = [row.cells[0].content.value for row in result_table.rows if row.selected]
                 if daq_pins:
-                    result = asyncio.run(api_request(url))
-                    if result['success'] == True:
-                        page.banner = banner(parse_data(result, result_table), bgcolor=ft.colors.GREEN)
-                    else:
-                        page.banner = banner(result['data'][0])
+                    node_name = str(node_dropdown.value).split(' | ')[0]
+                    def received(result):
+                        if result['success'] == True:
+                            samples.add(node_name, endpoint, result)
+                            sample_buffers[endpoint].append_response(result)
+                            page.banner = banner(parse_data(sample_buffers[endpoint], result_table), bgcolor=ft.colors.GREEN)
+                            if endpoint == ai_endpoint:
+                                update_chart()
+                        else:
+                            page.banner = banner(result['data'][0])
+                        page.update()
+                    track_request(api.post_request(url, callback=received, deadline=deadline))
                 else:
                     page.banner = banner('Please select one or more pin...')
                     clear_data(result_table)
             if daq_pin_values:
-                result = asyncio.run(api_request(url, payload={'value': daq_pin_values}))
-                if result['success'] == True:
-                    page.banner = banner('Success', bgcolor=ft.colors.GREEN)
-                else:
-                    page.banner = banner(result['data'][0])
+                def written(result):
+                    if result['success'] == True:
+                        page.banner = banner('Success', bgcolor=ft.colors.GREEN)
+                    else:
+                        page.banner = banner(result['data'][0])
+                    page.update()
+                track_request(api.post_request(url, payload={'value': daq_pin_values}, callback=written, deadline=deadline))
         else:
             page.banner = banner('Please select destination remoteDAQ node...')
             clear_data(result_table)
         page.update()
 
+    '''Continuous Acquisition Function'''
+    acq_job = None
+    def continuous_clicked(e):
+        nonlocal acq_job
+        if acq_job:
+            stop_continuous()
+            page.update()
+            return
+        selected_node = str(node_dropdown.value).split(' | ')[1] if node_dropdown.value else ''
+        tables = {
+            ai_endpoint: ai_result_table,
+            di_endpoint: di_result_table,
+            doi_endpoint: doi_result_table,
+        }
+        endpoints = [endpoint for endpoint, table in tables.items() if any(row.selected for row in table.rows)]
+        try:
+            rate = float(sample_rate.value)
+        except ValueError:
+            rate = 0
+        if not selected_node:
+            page.banner = banner('Please select destination remoteDAQ node...')
+        elif not endpoints:
+            page.banner = banner('Please select one or more pin...')
+        elif rate <= 0:
+            page.banner = banner('Please insert a valid sample rate...')
+        else:
+            '''Hold the longest chart window at this rate, up to BUFFER_MAX_SAMPLES'''
+            for buffer in sample_buffers.values():
+                buffer.max_samples = min(int(rate * max(chart_windows) * 1.05) + 1, buffer_size)
+            def on_data(frame):
+                for endpoint, buffer in frame.items():
+                    parse_data(buffer, tables[endpoint])
+                if ai_endpoint in frame:
+                    update_chart()
+            acq_job = remoteDAQ_Acquisition.acquisition(
+                selected_node,
+                endpoints,
+                on_data,
+                sample_rate=rate,
+                ui_rate=float(getenv('ACQ_UI_RATE', 5)),
+                node_name=str(node_dropdown.value).split(' | ')[0],
+                writer=samples,
+                buffers=sample_buffers,
+                transport=getenv('ACQ_TRANSPORT', 'auto'),
+                state=shared_state,
+            )
+            acq_job.start()
+            continuous_button.text = 'Stop Continuous'
+            sample_rate.disabled = True
+        page.update()
+
+    '''Stop Continuous Acquisition Function'''
+    def stop_continuous():
+        nonlocal acq_job
+        if acq_job:
+            acq_job.stop()
+            acq_job = None
+        continuous_button.text = 'Start Continuous'
+        sample_rate.disabled = False
+
+    '''Continuous Acquisition Controls'''
+    sample_rate = ft.TextField(
+        label='Sample Rate',
+        suffix_text='Hz',
+        value='1',
+        width=150,
+    )
+    continuous_button = ft.FilledButton(
+        'Start Continuous',
+        on_click=continuous_clicked,
+    )
+
     '''DAQ Selected Pins'''
     def output_pins(e):
         out_type = e.control.text.lower().split(' ')[1:-1][0]
         if out_type == 'analog':
-            return [float(str(pin.value)) if pin.value != '' else 0 for pin in [
-                    ao_pin_0,
-                    ao_pin_1,
-                ]
-            ]
+            return ao_values()
         
         if out_type == 'digital':
-            return [int(bool(pin.value)) for pin in [
-                    do_pin_0,
-                    do_pin_1,
-                    do_pin_2,
-                    do_pin_3,
-                    do_pin_4,
-                    do_pin_5,
-                    do_pin_6,
-                    do_pin_7,
-                ]
+            return do_values()
+
+    '''Analog Output Values Function'''
+    def ao_values():
+        return [float(str(pin.value)) if pin.value != '' else 0 for pin in [
+                ao_pin_0,
+                ao_pin_1,
+            ]
+        ]
+
+    '''Digital Output Values Function'''
+    def do_values():
+        return [int(bool(pin.value)) for pin in [
+                do_pin_0,
+                do_pin_1,
+                do_pin_2,
+                do_pin_3,
+                do_pin_4,
+                do_pin_5,
+                do_pin_6,
+                do_pin_7,
             ]
+        ]
+
+    '''Set Output State Function'''
+    def set_output_state(e, all_nodes=False):
+        if all_nodes:
+            nodes = dict(label.split(' | ') for label in zt_members.presence.online.values())
+        else:
+            nodes = dict([str(node_dropdown.value).split(' | ')]) if node_dropdown.value else {}
+        if nodes:
+            output_pb.visible = True
+            api.post(
+                remoteDAQ_Output.set_outputs(
+                    nodes,
+                    remoteDAQ_Output.output_state(ao=ao_values(), do=do_values()),
+                    concurrency=int(getenv('FANOUT_CONCURRENCY', 16)),
+                    timeout=float(getenv('FANOUT_TIMEOUT', 5)),
+                    client=api,
+                ),
+                callback=show_output_acks,
+            )
+        elif all_nodes:
+            page.banner = banner('No online remoteDAQ node...')
+        else:
+            page.banner = banner('Please select destination remoteDAQ node...')
+        page.update()
+
+    '''Show Output Acknowledgements Function'''
+    def show_output_acks(acks):
+        output_pb.visible = False
+        failed = {name: ack for name, ack in acks.items() if ack['success'] != True}
+        if not failed:
+            page.banner = banner('Output state set and verified on {} node(s)'.format(len(acks)), bgcolor=ft.colors.GREEN)
+        elif len(acks) == 1:
+            page.banner = banner('; '.join(next(iter(failed.values()))['data']))
+        else:
+            page.banner = banner('{} of {} node(s) failed: {}'.format(len(failed), len(acks), ', '.join(sorted(failed))))
+        page.update()
 
     '''Check AO Value Function'''
     def check_ao_value(e):
@@ -449,6 +537,15 @@ def main(page: ft.Page):
     ao_endpoint = '/analog/output'
     do_endpoint = '/digital/output'
 
+    '''Sample Buffer Instance'''
+    buffer_size = int(getenv('BUFFER_MAX_SAMPLES', 1000000))
+    chart_windows = {60: '1 Minute', 600: '10 Minutes', 3600: '1 Hour'}
+    sample_buffers = {
+        ai_endpoint: remoteDAQ_Buffer.sample_buffer(typecode=remoteDAQ_Buffer.ANALOG, max_samples=buffer_size),
+        di_endpoint: remoteDAQ_Buffer.sample_buffer(typecode=remoteDAQ_Buffer.DIGITAL, max_samples=buffer_size),
+        doi_endpoint: remoteDAQ_Buffer.sample_buffer(typecode=remoteDAQ_Buffer.DIGITAL, max_samples=buffer_size),
+    }
+
     '''Input Row'''
     input_row = ft.Row(
         [
@@ -526,6 +623,7 @@ def main(page: ft.Page):
     )
 
     '''Output Row'''
+    output_pb = ft.ProgressBar(width=150, visible=False)
     output_row = ft.Row(
         [
             card(obj=
@@ -615,6 +713,258 @@ def main(page: ft.Page):
         wrap=True,
     )
 
+    '''Play Sequence Function'''
+    player = None
+    def play_sequence(e, all_nodes=False):
+        nonlocal player
+        if player and player.running:
+            page.banner = banner('A sequence is already playing...')
+            page.update()
+            return
+        if all_nodes:
+            nodes = dict(label.split(' | ') for label in zt_members.presence.online.values())
+        else:
+            nodes = dict([str(node_dropdown.value).split(' | ')]) if node_dropdown.value else {}
+        try:
+            timeline = remoteDAQ_Sequence.parse_timeline(str(sequence_timeline.value))
+            rate = float(sequence_rate.value)
+        except ValueError as ex:
+            timeline, rate = None, 0
+            page.banner = banner('Invalid sequence: ' + str(ex))
+        if not nodes:
+            page.banner = banner('No online remoteDAQ node...' if all_nodes else 'Please select destination remoteDAQ node...')
+        elif timeline and rate > 0:
+            player = remoteDAQ_Sequence.sequence_player(nodes, timeline, rate=rate, client=api, on_done=sequence_done)
+            player.start()
+            sequence_status.value = 'Playing {:.1f} s on {} node(s)...'.format(timeline.duration, len(nodes))
+        elif timeline:
+            page.banner = banner('Please insert a valid update rate...')
+        page.update()
+
+    '''Stop Sequence Function'''
+    def stop_sequence(e=None):
+        if player:
+            player.stop()
+
+    '''Sequence Done Function'''
+    def sequence_done(stats):
+        sequence_status.value = '{:.1f}/{:g} Hz, jitter p95 {:.1f} ms, max {:.1f} ms, {} missed tick(s), {} write error(s)'.format(
+            stats['achieved_rate'],
+            stats['target_rate'],
+            stats['jitter_ms']['p95'],
+            stats['jitter_ms']['max'],
+            stats['missed_ticks'],
+            stats['errors'],
+        )
+        page.update()
+
+    '''Sequence Menu'''
+    sequence_timeline = ft.TextField(
+        label='Timeline (CSV or JSON)',
+        hint_text='t,ao_0,ao_1,do_0,do_1,do_2,do_3,do_4,do_5,do_6,do_7,ramp',
+        multiline=True,
+        min_lines=4,
+        max_lines=8,
+        width=600,
+    )
+    sequence_rate = ft.TextField(
+        label='Update Rate',
+        suffix_text='Hz',
+        value='10',
+        width=150,
+    )
+    sequence_status = ft.Text('', size=12)
+    sequence_menu = card(obj=
+        ft.Column(
+            [
+                ft.Text('Output Sequence', weight=ft.FontWeight.BOLD),
+                sequence_timeline,
+                ft.Row(
+                    [
+                        sequence_rate,
+                        ft.FilledButton(
+                            'Play',
+                            on_click=play_sequence,
+                        ),
+                        ft.OutlinedButton(
+                            'Play on All Online Nodes',
+                            on_click=lambda e: play_sequence(e, all_nodes=True),
+                        ),
+                        ft.TextButton(
+                            'Stop',
+                            on_click=stop_sequence,
+                        ),
+                    ],
+                    alignment=ft.MainAxisAlignment.CENTER,
+                    wrap=True,
+                ),
+                sequence_status,
+            ],
+            horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+        ),
+        height=360,
+        width=650
+    )
+
+    '''Read All Nodes Function'''
+    def read_all_nodes(e):
+        nodes = dict(label.split(' | ') for label in zt_members.presence.online.values())
+        endpoint = all_nodes_endpoint.value
+        if nodes:
+            all_nodes_pb.visible = True
+            track_request(api.post(
+                remoteDAQ_Acquisition.fan_out(
+                    nodes,
+                    endpoint,
+                    concurrency=int(getenv('FANOUT_CONCURRENCY', 16)),
+                    timeout=float(getenv('FANOUT_TIMEOUT', 5)),
+                    client=api,
+                ),
+                callback=lambda results: show_all_nodes(endpoint, results),
+            ))
+        else:
+            page.banner = banner('No online remoteDAQ node...')
+        page.update()
+
+    '''Show All Nodes Result Function'''
+    def show_all_nodes(endpoint, results):
+        all_nodes_result_table.rows.clear()
+        failed = 0
+        for name in sorted(results):
+            result = results[name]
+            if result['success'] == True:
+                samples.add(name, endpoint, result)
+                for pin, value in enumerate(result['data']):
+                    all_nodes_result_table.rows.append(
+                        ft.DataRow([ft.DataCell(ft.Text(i)) for i in [name, str(pin), str(value['value'])]])
+                    )
+            else:
+                failed += 1
+                all_nodes_result_table.rows.append(
+                    ft.DataRow([ft.DataCell(ft.Text(i)) for i in [name, '-', str(result['data'][0])]])
+                )
+        all_nodes_pb.visible = False
+        if failed:
+            page.banner = banner('{} of {} node(s) failed to respond'.format(failed, len(results)))
+        else:
+            page.banner = banner('Success', bgcolor=ft.colors.GREEN)
+        page.update()
+
+    '''All Nodes Menu'''
+    all_nodes_pb = ft.ProgressBar(width=250, visible=False)
+    all_nodes_endpoint = ft.Dropdown(
+        label='Channel',
+        value=ai_endpoint,
+        width=250,
+        options=[
+            ft.dropdown.Option(ai_endpoint, 'Analog Input'),
+            ft.dropdown.Option(di_endpoint, 'Digital Input'),
+            ft.dropdown.Option(doi_endpoint, '"Digital Output" Input'),
+        ],
+    )
+    all_nodes_menu = card(obj=
+        ft.Column(
+            [
+                ft.Text('All Nodes', weight=ft.FontWeight.BOLD),
+                ft.Row(
+                    [
+                        all_nodes_endpoint,
+                        ft.FilledButton(
+                            'Read All Nodes',
+                            on_click=read_all_nodes,
+                        ),
+                        ft.OutlinedButton(
+                            'Cancel',
+                            on_click=cancel_requests,
+                        ),
+                    ],
+                    alignment=ft.MainAxisAlignment.CENTER,
+                ),
+                all_nodes_pb,
+                ft.Row(
+                    [
+                        all_nodes_result_table,
+                    ],
+                    scroll=ft.ScrollMode.ADAPTIVE,
+                )
+            ],
+            horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+            expand=1,
+            scroll=ft.ScrollMode.ADAPTIVE,
+        ),
+        width=800
+    )
+
+    '''Update Chart Function'''
+    def update_chart(e=None):
+        if page.route != '/' or main_tab.tabs[main_tab.selected_index] is not chart_tab:
+            return
+        window = int(chart_window.value) * 10**9
+        now = time.time_ns()
+        channels = [i for i, row in enumerate(ai_result_table.rows) if row.selected] or range(len(ai_result_table.rows))
+        series = {channel: chart_decimator.series(channel, window, now) for channel in channels}
+        chart_image.src_base64 = remoteDAQ_Chart.svg_base64(remoteDAQ_Chart.svg_chart(series, now - window, now))
+        buffer = sample_buffers[ai_endpoint]
+        with buffer.lock:
+            full = buffer.max_samples and len(buffer) >= buffer.max_samples
+            oldest = buffer.timestamps[0] if len(buffer) else now
+        if full and oldest > now - window:
+            chart_note.value = 'Showing the last {:.1f} min only, the buffer is capped at {} samples (BUFFER_MAX_SAMPLES)'.format((now - oldest) / 6e10, buffer.max_samples)
+        else:
+            chart_note.value = ''
+        chart_image.update()
+        chart_note.update()
+
+    '''Chart Menu'''
+    chart_decimator = remoteDAQ_Chart.chart_decimator(sample_buffers[ai_endpoint], points=int(getenv('CHART_POINTS', 600)))
+    chart_image = ft.Image(
+        src_base64=remoteDAQ_Chart.svg_base64(remoteDAQ_Chart.svg_chart({}, 0, 1)),
+        width=800,
+        height=300,
+    )
+    chart_window = ft.Dropdown(
+        label='Window',
+        value='60',
+        width=200,
+        options=[
+            ft.dropdown.Option(str(seconds), label) for seconds, label in chart_windows.items()
+        ],
+        on_change=update_chart,
+    )
+    chart_note = ft.Text('', size=12, color=ft.colors.BLACK54)
+    chart_menu = card(obj=
+        ft.Column(
+            [
+                ft.Text('Analog Input Chart', weight=ft.FontWeight.BOLD),
+                chart_window,
+                chart_image,
+                chart_note,
+                ft.Row(
+                    [
+                        ft.Text('AI Pin ' + str(i), color=remoteDAQ_Chart.COLORS[i]) for i in range(len(ai_result_table.rows))
+                    ],
+                    alignment=ft.MainAxisAlignment.CENTER,
+                    wrap=True,
+                ),
+            ],
+            horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+            expand=1,
+            scroll=ft.ScrollMode.ADAPTIVE,
+        ),
+        width=850
+    )
+    chart_tab = ft.Tab(
+        text='Chart',
+        content=ft.Container(
+            ft.Row(
+                [
+                    chart_menu,
+                ],
+                alignment=ft.MainAxisAlignment.CENTER,
+            )
+        ),
+    )
+
     '''Main Tab'''
     main_tab = ft.Tabs(
         selected_index=0,
@@ -623,17 +973,70 @@ def main(page: ft.Page):
             ft.Tab(
                 text='Input',
                 content=ft.Container(
-                    input_row
+                    ft.Column(
+                        [
+                            ft.Row(
+                                [
+                                    sample_rate,
+                                    continuous_button,
+                                    ft.OutlinedButton(
+                                        'Cancel Requests',
+                                        on_click=cancel_requests,
+                                    ),
+                                ],
+                                alignment=ft.MainAxisAlignment.CENTER,
+                            ),
+                            input_row,
+                        ],
+                    )
                 ),
             ),
             ft.Tab(
                 text='Output',
                 content=ft.Container(
-                    output_row
+                    ft.Column(
+                        [
+                            ft.Row(
+                                [
+                                    ft.FilledButton(
+                                        'Set All Outputs',
+                                        on_click=set_output_state,
+                                    ),
+                                    ft.OutlinedButton(
+                                        'Set All Online Nodes',
+                                        on_click=lambda e: set_output_state(e, all_nodes=True),
+                                    ),
+                                    output_pb,
+                                ],
+                                alignment=ft.MainAxisAlignment.CENTER,
+                            ),
+                            output_row,
+                            ft.Row(
+                                [
+                                    sequence_menu,
+                                ],
+                                alignment=ft.MainAxisAlignment.CENTER,
+                            ),
+                        ],
+                        scroll=ft.ScrollMode.ADAPTIVE,
+                    )
                 ),
             ),
+            ft.Tab(
+                text='All Nodes',
+                content=ft.Container(
+                    ft.Row(
+                        [
+                            all_nodes_menu,
+                        ],
+                        alignment=ft.MainAxisAlignment.CENTER,
+                    )
+                ),
+            ),
+            chart_tab,
         ],
         expand=1,
+        on_change=update_chart,
     )
 
     '''Status Menu'''
@@ -655,6 +1058,243 @@ def main(page: ft.Page):
         width=800
     )
 
+    '''Update Provisioning Row Function'''
+    provision_rows = {}
+    def update_provision_row(job):
+        values = [job['node_id'], job['name'], job['ip'], job['state'].replace('_', ' '), job['message']]
+        if job['node_id'] in provision_rows:
+            for cell, value in zip(provision_rows[job['node_id']].cells, values):
+                cell.content.value = value
+        else:
+            provision_rows[job['node_id']] = ft.DataRow([ft.DataCell(ft.Text(i, selectable=True)) for i in values])
+            provision_result_table.rows.append(provision_rows[job['node_id']])
+        if page.route == '/provision':
+            provision_result_table.update()
+
+    '''Bulk Provisioning Function'''
+    def provision_clicked(e):
+        try:
+            entries = remoteDAQ_Provision.parse_csv(provision_csv.value or '')
+        except ValueError as err:
+            page.banner = banner(str(err))
+            page.update()
+            return
+        if entries:
+            queued = provisioning.submit(entries)
+            page.banner = banner('{} node(s) queued'.format(len(queued)), bgcolor=ft.colors.GREEN)
+            provision_csv.value = ''
+        else:
+            page.banner = banner('Please insert one or more node...')
+        page.update()
+
+    '''Provisioning Menu'''
+    provision_csv = ft.TextField(
+        label='Nodes CSV',
+        hint_text=','.join(remoteDAQ_Provision.CSV_FIELDS),
+        multiline=True,
+        min_lines=4,
+        max_lines=8,
+    )
+    provision_menu = card(obj=
+        ft.Column(
+            [
+                ft.Text('Node Provisioning', weight=ft.FontWeight.BOLD),
+                provision_csv,
+                ft.FilledButton(
+                    'Start Provisioning',
+                    on_click=provision_clicked,
+                ),
+                ft.Row(
+                    [
+                        provision_result_table,
+                    ],
+                    scroll=ft.ScrollMode.ADAPTIVE,
+                )
+            ],
+            horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+            expand=1,
+            scroll=ft.ScrollMode.ADAPTIVE,
+        ),
+        width=800
+    )
+
+    '''History Query Function'''
+    def history_clicked(e):
+        try:
+            pins = [int(p) for p in str(history_pins.value or '').split(',') if p.strip()]
+        except ValueError:
+            pins = None
+        if not history_node.value:
+            page.banner = banner('Please select a remoteDAQ node...')
+        elif pins is None:
+            page.banner = banner('Please insert pins as a comma separated list...')
+        elif not history.enabled:
+            page.banner = banner('InfluxDB is not configured...')
+        else:
+            now = time.time()
+            history_pb.visible = True
+            api.post(
+                history.query(history_node.value, history_endpoint.value, pins, remoteDAQ_History.parse_time(history_range.value, now), now, fn=history_fn.value),
+                callback=show_history,
+            )
+        page.update()
+
+    '''Show History Function'''
+    def show_history(result):
+        history_pb.visible = False
+        if result.get('success') == True:
+            high = 5 if history_endpoint.value == ai_endpoint else 1
+            history_image.src_base64 = remoteDAQ_Chart.svg_base64(
+                remoteDAQ_Chart.svg_chart(result['series'], result['start'] * 10**9, result['stop'] * 10**9, high=high)
+            )
+            points = sum(len(s) for s in result['series'].values())
+            history_status.value = '{} point(s) on {} pin(s), {} s {} windows'.format(points, len(result['series']), result['every'], history_fn.value)
+        else:
+            page.banner = banner(result['data'][0])
+        page.update()
+
+    '''History Export Function'''
+    def export_clicked(e, fmt):
+        if not history_node.value:
+            page.banner = banner('Please select a remoteDAQ node...')
+            page.update()
+            return
+        params = {
+            'node': history_node.value,
+            'endpoint': history_endpoint.value,
+            'pins': str(history_pins.value or '').replace(' ', ''),
+            'start': history_range.value,
+            'stop': 'now',
+            'every': 'raw',
+            'format': fmt,
+        }
+        page.launch_url(export_url() + '/export?' + history.sign(params))
+
+    '''Export Address Function'''
+    def export_url():
+        '''EXPORT_URL, else the metrics port when browsing on the server itself, else the proxy address the page came from'''
+        if getenv('EXPORT_URL'):
+            return getenv('EXPORT_URL').rstrip('/')
+        url = urlparse(page.url or '')
+        if url.hostname in ('localhost', '127.0.0.1'):
+            return 'http://{}:{}'.format(url.hostname, server.port)
+        return '{}://{}'.format(url.scheme or 'http', url.netloc)
+
+    '''Update History Nodes Function'''
+    def update_history_nodes():
+        names = sorted({m['name'] for m in zt_members.get_members()})
+        history_node.options = [ft.dropdown.Option(name) for name in names]
+
+    '''History Menu'''
+    history_node = ft.Dropdown(label='Node', width=250)
+    history_endpoint = ft.Dropdown(
+        label='Channel',
+        value=ai_endpoint,
+        width=250,
+        options=[
+            ft.dropdown.Option(ai_endpoint, 'Analog Input'),
+            ft.dropdown.Option(di_endpoint, 'Digital Input'),
+            ft.dropdown.Option(doi_endpoint, '"Digital Output" Input'),
+        ],
+    )
+    history_range = ft.Dropdown(
+        label='Range',
+        value='-1h',
+        width=150,
+        options=[
+            ft.dropdown.Option('-15m', '15 Minutes'),
+            ft.dropdown.Option('-1h', '1 Hour'),
+            ft.dropdown.Option('-6h', '6 Hours'),
+            ft.dropdown.Option('-1d', '1 Day'),
+            ft.dropdown.Option('-7d', '7 Days'),
+            ft.dropdown.Option('-30d', '30 Days'),
+        ],
+    )
+    history_fn = ft.Dropdown(
+        label='Aggregate',
+        value='mean',
+        width=150,
+        options=[ft.dropdown.Option(fn) for fn in remoteDAQ_History.AGGREGATES],
+    )
+    history_pins = ft.TextField(label='Pins', hint_text='All pins', width=150)
+    history_pb = ft.ProgressBar(width=250, visible=False)
+    history_image = ft.Image(
+        src_base64=remoteDAQ_Chart.svg_base64(remoteDAQ_Chart.svg_chart({}, 0, 1)),
+        width=800,
+        height=300,
+    )
+    history_status = ft.Text('', size=12)
+    history_menu = card(obj=
+        ft.Column(
+            [
+                ft.Text('History', weight=ft.FontWeight.BOLD),
+                ft.Row(
+                    [
+                        history_node,
+                        history_endpoint,
+                        history_range,
+                        history_fn,
+                        history_pins,
+                    ],
+                    alignment=ft.MainAxisAlignment.CENTER,
+                    wrap=True,
+                ),
+                ft.Row(
+                    [
+                        ft.FilledButton(
+                            'Query',
+                            on_click=history_clicked,
+                        ),
+                        ft.OutlinedButton(
+                            'Export CSV',
+                            on_click=lambda e: export_clicked(e, 'csv'),
+                        ),
+                        ft.OutlinedButton(
+                            'Export Parquet',
+                            on_click=lambda e: export_clicked(e, 'parquet'),
+                            visible=remoteDAQ_History.pa is not None,
+                        ),
+                    ],
+                    alignment=ft.MainAxisAlignment.CENTER,
+                ),
+                history_pb,
+                history_image,
+                history_status,
+            ],
+            horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+            expand=1,
+            scroll=ft.ScrollMode.ADAPTIVE,
+        ),
+        width=850
+    )
+
+    '''Update Server Health Table Function'''
+    def update_health_table():
+        if page.route == '/health':
+            health_result_table.rows = [
+                ft.DataRow([ft.DataCell(ft.Text(i, selectable=True)) for i in row]) for row in metrics.summary()
+            ]
+            health_result_table.update()
+
+    '''Server Health Menu'''
+    health_menu = card(obj=
+        ft.Column(
+            [
+                ft.Text('Server Health', weight=ft.FontWeight.BOLD),
+                ft.Row(
+                    [
+                        health_result_table,
+                    ],
+                    scroll=ft.ScrollMode.ADAPTIVE,
+                )
+            ],
+            horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+            expand=1,
+            scroll=ft.ScrollMode.ADAPTIVE,
+        ),
+        width=800
+    )
+
     '''About Menu'''
     about_menu = card(obj=
         ft.Column(
@@ -700,6 +1340,21 @@ def main(page: ft.Page):
                 selected_icon_content=ft.Icon(ft.icons.MONITOR_HEART_SHARP),
                 label='Node Status',
             ),
+            ft.NavigationRailDestination(
+                icon_content=ft.Icon(ft.icons.BUILD_CIRCLE_OUTLINED),
+                selected_icon_content=ft.Icon(ft.icons.BUILD_CIRCLE),
+                label='Provisioning',
+            ),
+            ft.NavigationRailDestination(
+                icon_content=ft.Icon(ft.icons.HISTORY_OUTLINED),
+                selected_icon_content=ft.Icon(ft.icons.HISTORY),
+                label='History',
+            ),
+            ft.NavigationRailDestination(
+                icon_content=ft.Icon(ft.icons.INSIGHTS_OUTLINED),
+                selected_icon_content=ft.Icon(ft.icons.INSIGHTS),
+                label='Server Health',
+            ),
             ft.NavigationRailDestination(
                 icon_content=ft.Icon(ft.icons.INFO_OUTLINE),
                 selected_icon_content=ft.Icon(ft.icons.INFO),
@@ -722,6 +1377,21 @@ def main(page: ft.Page):
                 selected_icon_content=ft.Icon(ft.icons.MONITOR_HEART_SHARP),
                 label='Node Status',
             ),
+            ft.NavigationDestination(
+                icon_content=ft.Icon(ft.icons.BUILD_CIRCLE_OUTLINED),
+                selected_icon_content=ft.Icon(ft.icons.BUILD_CIRCLE),
+                label='Provisioning',
+            ),
+            ft.NavigationDestination(
+                icon_content=ft.Icon(ft.icons.HISTORY_OUTLINED),
+                selected_icon_content=ft.Icon(ft.icons.HISTORY),
+                label='History',
+            ),
+            ft.NavigationDestination(
+                icon_content=ft.Icon(ft.icons.INSIGHTS_OUTLINED),
+                selected_icon_content=ft.Icon(ft.icons.INSIGHTS),
+                label='Server Health',
+            ),
             ft.NavigationDestination(
                 icon_content=ft.Icon(ft.icons.INFO_OUTLINE),
                 selected_icon_content=ft.Icon(ft.icons.INFO),
@@ -756,10 +1426,21 @@ def main(page: ft.Page):
         if route_data == '/status':
             '''/status Route'''
             view.controls.append(status_menu)
+        if route_data == '/provision':
+            '''/provision Route'''
+            view.controls.append(provision_menu)
+        if route_data == '/history':
+            '''/history Route'''
+            update_history_nodes()
+            view.controls.append(history_menu)
+        if route_data == '/health':
+            '''/health Route'''
+            view.controls.append(health_menu)
         if route_data == '/about':
             '''/about Route'''
             view.controls.append(about_menu)
         page.update()
+        update_health_table()
     
     '''Page Resize Function'''
     def page_resize(e):
@@ -785,10 +1466,28 @@ def main(page: ft.Page):
     page.go(page.route)
 
     '''Loop Subroutine'''
-    sched = BackgroundScheduler()
-    sched.add_job(update_node_dropdown, 'interval', seconds=3)
-    sched.add_job(update_status_table, 'interval', seconds=5)
-    sched.start()
+    def subscribe(e=None):
+        active_sessions.add(page.session_id)
+        online = zt_members.presence.subscribe(page.session_id, update_node_dropdown)
+        update_node_dropdown(online, [k for k in node_options if k not in online])
+        scheduler.subscribe(page.session_id, 'status_table', update_status_table)
+        scheduler.subscribe(page.session_id, 'server_health', update_health_table)
+        for job in provisioning.subscribe(page.session_id, update_provision_row):
+            update_provision_row(job)
+
+    def unsubscribe(e=None):
+        active_sessions.discard(page.session_id)
+        zt_members.presence.unsubscribe(page.session_id)
+        provisioning.unsubscribe(page.session_id)
+        provisioning.unsubscribe((page.session_id, 'add_node'))
+        scheduler.unsubscribe(page.session_id)
+        stop_continuous()
+        stop_sequence()
+        cancel_requests()
+
+    page.on_connect = subscribe
+    page.on_disconnect = unsubscribe
+    subscribe()
 
 if __name__ == '__main__':
-    ft.app(target=main, view=ft.WEB_BROWSER, port=2023)
\ No newline at end of file
+    ft.app(target=main, view=ft.WEB_BROWSER, port=int(getenv('UI_PORT', 2023)))
\ No newline at end of file
@@ -0,0 +1,247 @@
+import aiohttp
+import asyncio
+import logging
+import time
+import uuid
+from urllib.parse import urlencode
+import remoteDAQ_Client
+import remoteDAQ_Buffer
+
+'''Logger Config'''
+my_logger = logging.getLogger('RemoteDAQ_Server')
+
+'''Node Stream Config'''
+STREAM_ENDPOINT = '/stream'
+UNSUPPORTED = (400, 404, 405, 501)
+
+'''Node URL Function'''
+def node_url(node_ip, endpoint):
+    return 'http://' + node_ip + ':8000' + endpoint
+
+'''Node Stream URL Function'''
+def stream_url(node_ip, endpoints, rate):
+    return 'ws://' + node_ip + ':8000' + STREAM_ENDPOINT + '?' + urlencode({'endpoints': ','.join(endpoints), 'rate': rate})
+
+'''Continuous Acquisition Class'''
+class acquisition:
+    '''Streams or polls one node in a background asyncio task and hands the updated sample buffers to the UI at a capped rate'''
+    def __init__(self, node_ip, endpoints, on_data, sample_rate=1, ui_rate=5, node_name=None, writer=None, buffers=None, client=None, transport='auto', max_backoff=30, state=None, state_ttl=30):
+        self.node_ip = node_ip
+        self.node_name = node_name or node_ip
+        self.writer = writer
+        self.endpoints = list(endpoints)
+        self.on_data = on_data
+        self.sample_rate = sample_rate
+        self.ui_rate = ui_rate
+        self.client = client or remoteDAQ_Client.get_client()
+        self.transport = transport
+        self.max_backoff = max_backoff
+        self.state = state
+        self.state_ttl = state_ttl
+        self.job_id = uuid.uuid4().hex
+        self.mode = 'poll' if transport == 'poll' else 'stream'
+        self.buffers = buffers or {}
+        for endpoint in self.endpoints:
+            if endpoint not in self.buffers:
+                self.buffers[endpoint] = remoteDAQ_Buffer.sample_buffer(
+                    typecode=remoteDAQ_Buffer.ANALOG if endpoint == '/analog/input' else remoteDAQ_Buffer.DIGITAL
+                )
+        self.updated = set()
+        self.new_data = False
+        self.pushing = False
+        self.running = False
+        self.tasks = []
+        self.samples = 0
+        self.errors = 0
+        self.overruns = 0
+        self.reconnects = 0
+        self.frames = 0
+        self.dropped_frames = 0
+        self.started_at = 0.0
+
+    '''Acquisition Loop Function'''
+    async def acquire(self):
+        '''Stream from the node, poll while reconnecting with backoff, poll for good if the node has no stream endpoint'''
+        if self.transport == 'poll':
+            await self.poll()
+            return
+        loop = asyncio.get_running_loop()
+        backoff = 1
+        while self.running:
+            samples = self.samples
+            try:
+                await self.stream()
+            except aiohttp.WSServerHandshakeError as e:
+                if e.status in UNSUPPORTED:
+                    my_logger.info('Node has no stream endpoint, polling instead', extra={'node': self.node_ip, 'endpoint': STREAM_ENDPOINT})
+                    self.mode = 'poll'
+                    await self.poll()
+                    return
+                my_logger.error('### Node Stream Handshake Failed ###', extra={'node': self.node_ip, 'endpoint': STREAM_ENDPOINT})
+            except Exception as e:
+                my_logger.error('### Node Stream Interrupted ###', extra={'node': self.node_ip, 'endpoint': STREAM_ENDPOINT})
+                my_logger.error(e, extra={'node': self.node_ip, 'endpoint': STREAM_ENDPOINT})
+            if not self.running:
+                return
+            if self.samples > samples:
+                backoff = 1
+            self.reconnects += 1
+            self.mode = 'poll'
+            await self.poll(loop.time() + backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    '''Stream Loop Function'''
+    async def stream(self):
+        '''Each frame holds one reading of every requested endpoint, {"t": ns, "data": {endpoint: [values]}}'''
+        url = stream_url(self.node_ip, self.endpoints, self.sample_rate)
+        async for frame in self.client.node_stream(url, receive_timeout=max(5, 3 / self.sample_rate)):
+            if not self.running:
+                return
+            self.mode = 'stream'
+            timestamp = int(frame.get('t') or time.time_ns())
+            for endpoint, values in frame['data'].items():
+                if endpoint not in self.buffers:
+                    continue
+                self.buffers[endpoint].append_values(values, timestamp)
+                self.updated.add(endpoint)
+                self.new_data = True
+                if self.writer:
+                    self.writer.add_values(self.node_name, endpoint, values, timestamp)
+            self.samples += 1
+
+    '''Poll Loop Function'''
+    async def poll(self, until=None):
+        '''One GET per endpoint per tick, until a loop time if given'''
+        loop = asyncio.get_running_loop()
+        period = 1 / self.sample_rate
+        next_tick = loop.time()
+        while self.running and (until is None or loop.time() < until):
+            timestamp = time.time_ns()
+            results = await asyncio.gather(*[
+                self.client.api_request(node_url(self.node_ip, endpoint), max_age=0) for endpoint in self.endpoints
+            ])
+            for endpoint, result in zip(self.endpoints, results):
+                if result.get('success'):
+                    self.buffers[endpoint].append_response(result, timestamp)
+                    self.updated.add(endpoint)
+                    self.new_data = True
+                    if self.writer:
+                        self.writer.add(self.node_name, endpoint, result, timestamp)
+                else:
+                    self.errors += 1
+            self.samples += 1
+            next_tick += period
+            delay = next_tick - loop.time()
+            if delay < 0:
+                self.overruns += 1
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    '''UI Refresh Loop Function'''
+    async def refresh(self):
+        loop = asyncio.get_running_loop()
+        while self.running:
+            await asyncio.sleep(1 / self.ui_rate)
+            if not self.new_data:
+                continue
+            if self.pushing:
+                self.dropped_frames += 1
+                continue
+            self.pushing = True
+            self.new_data = False
+            updated, self.updated = self.updated, set()
+            loop.run_in_executor(None, self.push, {endpoint: self.buffers[endpoint] for endpoint in updated})
+
+    '''Push Frame Function'''
+    def push(self, frame):
+        try:
+            self.on_data(frame)
+            self.frames += 1
+        except Exception as e:
+            my_logger.error('### Unexpected Acquisition UI Update Error Occured ###')
+            my_logger.error(e)
+        finally:
+            self.pushing = False
+
+    '''Announce Loop Function'''
+    async def announce(self):
+        '''Keep this job listed in the shared state while it runs, the entry expires if the worker dies'''
+        loop = asyncio.get_running_loop()
+        while self.running:
+            await loop.run_in_executor(self.client.blocking, self.publish)
+            await asyncio.sleep(self.state_ttl / 3)
+
+    '''Publish Job Function'''
+    def publish(self):
+        try:
+            self.state.set('acquisitions', self.job_id, {
+                'node': self.node_name,
+                'node_ip': self.node_ip,
+                'endpoints': self.endpoints,
+                'sample_rate': self.sample_rate,
+                'transport': self.mode,
+            }, ttl=self.state_ttl)
+        except Exception as e:
+            my_logger.error('### Failed to Publish Acquisition Job ###', extra={'node': self.node_ip})
+            my_logger.error(e)
+
+    '''Start Acquisition Function'''
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.started_at = time.monotonic()
+        self.tasks = [self.client.submit(self.acquire()), self.client.submit(self.refresh())]
+        if self.state is not None:
+            self.tasks.append(self.client.submit(self.announce()))
+
+    '''Stop Acquisition Function'''
+    def stop(self):
+        self.running = False
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        if self.state is not None:
+            try:
+                self.state.delete('acquisitions', self.job_id)
+            except Exception as e:
+                my_logger.error('### Failed to Remove Acquisition Job ###', extra={'node': self.node_ip})
+                my_logger.error(e)
+
+    '''Acquisition Stats Function'''
+    def stats(self):
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            'node': self.node_ip,
+            'samples': self.samples,
+            'achieved_rate': self.samples / elapsed if elapsed else 0.0,
+            'errors': self.errors,
+            'overruns': self.overruns,
+            'transport': self.mode,
+            'reconnects': self.reconnects,
+            'frames': self.frames,
+            'dropped_frames': self.dropped_frames,
+        }
+
+'''Fan-Out Read Function'''
+async def fan_out(nodes, endpoint, concurrency=16, timeout=5, client=None):
+    '''Read one endpoint from many nodes concurrently, return {node name: api response}'''
+    client = client or remoteDAQ_Client.get_client()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def read(name, node_ip):
+        async with semaphore:
+            try:
+                return name, await asyncio.wait_for(client.api_request(node_url(node_ip, endpoint)), timeout)
+            except asyncio.TimeoutError:
+                my_logger.error('### Node Read Timed Out ###', extra={'node': name, 'endpoint': endpoint, 'latency': timeout})
+                return name, {'success':False, 'data':['Timeout after {} s'.format(timeout)]}
+
+    results = await asyncio.gather(*[read(name, node_ip) for name, node_ip in nodes.items()])
+    return dict(results)
+
+'''Synchronous Fan-Out Read Function'''
+def read_all(nodes, endpoint, concurrency=16, timeout=5, client=None):
+    client = client or remoteDAQ_Client.get_client()
+    return client.run(fan_out(nodes, endpoint, concurrency=concurrency, timeout=timeout, client=client))
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import time
+from collections import deque
+import remoteDAQ_Metrics
+
+'''Logger Config'''
+my_logger = logging.getLogger('RemoteDAQ_Server')
+
+'''Node Health Labels'''
+HEALTHY = 'Healthy'
+DEGRADED = 'Degraded'
+UNREACHABLE = 'Unreachable'
+UNKNOWN = 'Unknown'
+
+'''Node Circuit Breaker Class'''
+class node_breaker:
+    '''Failure count, latency history and open/closed state of one node, only touched from the client loop'''
+    def __init__(self, failure_threshold=3, initial_timeout=5.0, min_timeout=1.0, max_timeout=30.0, factor=3.0,
+                 retry=2.0, max_retry=60.0, history=200, min_samples=20):
+        self.failure_threshold = failure_threshold
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.factor = factor
+        self.retry = retry
+        self.max_retry = max_retry
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=history)
+        self.current_timeout = initial_timeout
+        self.failures = 0
+        self.open = False
+        self.opened_at = 0.0
+        self.retry_in = retry
+        self.next_probe = 0.0
+        self.last_success = 0.0
+        self.last_error = ''
+        self.url = None
+        self.probe_task = None
+        self.wake = None
+
+    '''Request Timeout Function'''
+    def timeout(self):
+        return self.current_timeout
+
+    '''Adapt Timeout Function'''
+    def adapt(self):
+        '''factor times the p99 of recent successful latencies, clamped to [min_timeout, max_timeout]'''
+        if len(self.latencies) < self.min_samples:
+            self.current_timeout = self.initial_timeout
+            return
+        ordered = sorted(self.latencies)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        self.current_timeout = min(self.max_timeout, max(self.min_timeout, p99 * self.factor))
+
+    '''Record Success Function'''
+    def success(self, latency):
+        '''Return True if this closed an open circuit'''
+        self.latencies.append(latency)
+        if len(self.latencies) % 10 == 0 or len(self.latencies) == self.min_samples:
+            self.adapt()
+        self.failures = 0
+        self.last_success = time.time()
+        if not self.open:
+            return False
+        self.open = False
+        self.retry_in = self.retry
+        return True
+
+    '''Record Failure Function'''
+    def failure(self, error):
+        '''Return True if this opened the circuit'''
+        self.failures += 1
+        self.last_error = type(error).__name__ if isinstance(error, Exception) else str(error)
+        if self.open:
+            self.retry_in = min(self.retry_in * 2, self.max_retry)
+            self.next_probe = time.monotonic() + self.retry_in
+            return False
+        if self.failures < self.failure_threshold:
+            return False
+        self.trip()
+        return True
+
+    '''Open Circuit Function'''
+    def trip(self):
+        self.open = True
+        self.opened_at = time.monotonic()
+        self.retry_in = self.retry
+        self.next_probe = self.opened_at + self.retry_in
+
+    '''Probe Delay Function'''
+    def probe_delay(self):
+        return max(self.next_probe - time.monotonic(), 0)
+
+    '''Node Health Function'''
+    def health(self):
+        if self.open:
+            return UNREACHABLE
+        if self.failures:
+            return DEGRADED
+        if self.last_success:
+            return HEALTHY
+        return UNKNOWN
+
+'''Node Breaker Registry Class'''
+class breaker_registry:
+    '''One circuit breaker per node address, open circuits reject requests at once until a background probe gets through'''
+    def __init__(self, **settings):
+        self.settings = settings
+        self.nodes = {}
+        metrics = remoteDAQ_Metrics.get_registry()
+        self.rejected = metrics.counter('remotedaq_node_breaker_rejected_total', 'Node requests failed fast by an open circuit')
+        self.transitions = metrics.counter('remotedaq_node_breaker_transitions_total', 'Node circuit breaker state changes', ['state'])
+
+    '''Node Breaker Function'''
+    def get(self, host):
+        breaker = self.nodes.get(host)
+        if breaker is None:
+            breaker = self.nodes.setdefault(host, node_breaker(**self.settings))
+        return breaker
+
+    '''Allow Request Function'''
+    def allow(self, host, url):
+        '''Return None if the request may go out, else the error result to fail fast with'''
+        breaker = self.get(host)
+        breaker.url = url
+        if not breaker.open:
+            return None
+        self.rejected.labels().inc()
+        return {'success':False, 'data':['Node {} unreachable ({}), next check in {:.0f} s'.format(host, breaker.last_error or 'no response', breaker.probe_delay())]}
+
+    '''Record Success Function'''
+    def success(self, host, latency):
+        if self.get(host).success(latency):
+            self.transitions.labels('closed').inc()
+            my_logger.info('Node circuit closed', extra={'node': host, 'latency': round(latency, 4)})
+
+    '''Record Failure Function'''
+    def failure(self, host, error):
+        '''Return True if the circuit just opened and needs a probe'''
+        breaker = self.get(host)
+        if breaker.failure(error):
+            self.transitions.labels('open').inc()
+            my_logger.warning('### Node Circuit Opened ###', extra={'node': host})
+            return True
+        return False
+
+    '''ZeroTier Presence Function'''
+    def presence(self, host, online):
+        '''Open the circuit of a known node ZeroTier reports offline, probe at once when it comes back, return True if a probe is needed'''
+        breaker = self.nodes.get(host)
+        if breaker is None:
+            return False
+        if not online:
+            if breaker.open:
+                return False
+            breaker.last_error = 'ZeroTier offline'
+            breaker.trip()
+            self.transitions.labels('open').inc()
+            my_logger.warning('### Node Circuit Opened ###', extra={'node': host})
+            return True
+        if breaker.open and breaker.next_probe > time.monotonic():
+            breaker.next_probe = time.monotonic()
+            if breaker.wake:
+                breaker.wake.set()
+        return False
+
+    '''Wait For Probe Function'''
+    async def wait_probe(self, host):
+        breaker = self.get(host)
+        if breaker.wake is None:
+            breaker.wake = asyncio.Event()
+        breaker.wake.clear()
+        try:
+            await asyncio.wait_for(breaker.wake.wait(), breaker.probe_delay())
+        except asyncio.TimeoutError:
+            pass
+
+    '''Node Health Function'''
+    def health(self, host):
+        breaker = self.nodes.get(host)
+        return breaker.health() if breaker else UNKNOWN
+
+    '''Breaker Stats Function'''
+    def stats(self):
+        return {host: {
+            'health': breaker.health(),
+            'failures': breaker.failures,
+            'timeout': breaker.timeout(),
+            'last_error': breaker.last_error,
+        } for host, breaker in list(self.nodes.items())}
+
+    '''Metrics Collector Function'''
+    def collect(self):
+        samples = []
+        for host, breaker in list(self.nodes.items()):
+            samples.append(('remotedaq_node_breaker_open', 'Node circuit open (1) or closed (0)', {'node': host}, int(breaker.open)))
+            samples.append(('remotedaq_node_timeout_seconds', 'Adaptive request timeout of a node', {'node': host}, breaker.timeout()))
+        return samples
@@ -0,0 +1,101 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+'''Value Typecodes'''
+ANALOG = 'd'
+DIGITAL = 'b'
+
+'''Sample Buffer Class'''
+class sample_buffer:
+    '''Columnar samples, one packed array per channel plus a shared int64 ns timestamp array'''
+    def __init__(self, channels=8, typecode=ANALOG, max_samples=None):
+        self.typecode = typecode
+        self.max_samples = max_samples
+        self.timestamps = array('q')
+        self.channels = [array(typecode) for _ in range(channels)]
+        self.lock = threading.Lock()
+
+    '''Buffer Length Function'''
+    def __len__(self):
+        return len(self.timestamps)
+
+    '''Append Row Function'''
+    def append(self, timestamp, values):
+        with self.lock:
+            self.append_row(timestamp, values)
+
+    '''Append Row Unlocked Function'''
+    def append_row(self, timestamp, values):
+        while len(self.channels) < len(values):
+            self.channels.append(array(self.typecode, bytes(array(self.typecode).itemsize * len(self.timestamps))))
+        self.timestamps.append(timestamp)
+        for column, value in zip(self.channels, values):
+            column.append(value)
+        if self.max_samples and len(self.timestamps) > self.max_samples + self.max_samples // 4:
+            self.trim(self.max_samples)
+
+    '''Append API Response Function'''
+    def append_response(self, api_response, timestamp=None):
+        '''Decode an input endpoint response straight into the columns'''
+        self.append_values([r['value'] for r in api_response['data']], timestamp)
+
+    '''Append Values Function'''
+    def append_values(self, values, timestamp=None):
+        '''Append one reading of every pin given as a plain list, as carried by stream frames'''
+        cast = float if self.typecode == ANALOG else int
+        self.append(timestamp or time.time_ns(), [cast(v) for v in values])
+
+    '''Trim Oldest Samples Function'''
+    def trim(self, keep):
+        '''Drop the oldest samples, callers hold the lock'''
+        excess = len(self.timestamps) - keep
+        if excess > 0:
+            del self.timestamps[:excess]
+            for column in self.channels:
+                del column[:excess]
+
+    '''Latest Value Function'''
+    def latest(self, channel):
+        column = self.channels[channel]
+        return column[-1] if column else None
+
+    '''Column Function'''
+    def column(self, channel):
+        return self.channels[channel]
+
+    '''Time Window Function'''
+    def window(self, start, end):
+        '''Return (first, last) indices of samples with start <= timestamp <= end'''
+        return bisect_left(self.timestamps, start), bisect_right(self.timestamps, end)
+
+    '''Column View Function'''
+    def view(self, channel):
+        '''Zero-copy NumPy view of a column when NumPy is installed, else the array itself, hold the lock while using it'''
+        column = self.channels[channel]
+        if np is not None:
+            return np.frombuffer(column, dtype=column.typecode)
+        return column
+
+    '''Channel Stats Function'''
+    def stats(self, channel):
+        column = self.channels[channel]
+        if not column:
+            return {'count': 0, 'min': None, 'max': None, 'mean': None}
+        if np is not None:
+            with self.lock:
+                values = self.view(channel)
+                stats = {'count': len(values), 'min': values.min().item(), 'max': values.max().item(), 'mean': values.mean().item()}
+                del values
+            return stats
+        return {'count': len(column), 'min': min(column), 'max': max(column), 'mean': sum(column) / len(column)}
+
+    '''Memory Usage Function'''
+    def nbytes(self):
+        return self.timestamps.itemsize * len(self.timestamps) + sum(c.itemsize * len(c) for c in self.channels)
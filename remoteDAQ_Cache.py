@@ -0,0 +1,218 @@
+import datetime
+import logging
+import threading
+import time
+from collections import deque
+from os import getenv
+from re import search
+import remoteDAQ_Breaker
+import remoteDAQ_Client
+import remoteDAQ_Metrics
+import remoteDAQ_State
+
+'''Logger Config'''
+my_logger = logging.getLogger('RemoteDAQ_Server')
+
+'''Check ZeroTier Node Status Function'''
+def isOnline(timestamp):
+    lastSeen = datetime.datetime.fromtimestamp(timestamp/1000)
+    now = datetime.datetime.now()
+    delta = now - lastSeen
+    if delta.seconds < 90:
+        return True
+    return False
+
+'''Node Health Function'''
+def node_health(member, client):
+    '''ZeroTier lastSeen combined with the circuit state of the node address'''
+    if not isOnline(member['lastSeen']):
+        return 'Offline'
+    if not member['config']['ipAssignments']:
+        return remoteDAQ_Breaker.UNKNOWN
+    return client.breakers.health(member['config']['ipAssignments'][0])
+
+'''Node Label Function'''
+def node_label(member):
+    return '{} | {}'.format(member['name'], member['config']['ipAssignments'][0])
+
+'''Node Presence Tracker Class'''
+class presence_tracker:
+    '''Works out online/offline changes from the member list and pushes them to subscribed sessions'''
+    def __init__(self, history=1000):
+        self.online = {}
+        self.listeners = {}
+        self.latencies = deque(maxlen=history)
+        self.changes = 0
+        self.lock = threading.Lock()
+
+    '''Update Presence Function'''
+    def update(self, members):
+        now = time.time()
+        online = {}
+        seen = {}
+        for r in members:
+            seen[r['nodeId']] = r['lastSeen'] / 1000
+            if isOnline(r['lastSeen']) and r['config']['ipAssignments']:
+                online[r['nodeId']] = node_label(r)
+        with self.lock:
+            added = {k: v for k, v in online.items() if self.online.get(k) != v}
+            removed = [k for k, v in self.online.items() if online.get(k) != v]
+            if not added and not removed:
+                return
+            for k in added:
+                self.latencies.append(now - seen[k])
+            for k in removed:
+                if k in seen and k not in online:
+                    self.latencies.append(now - (seen[k] + 90))
+            self.online = online
+            self.changes += 1
+            listeners = list(self.listeners.items())
+        for session_id, callback in listeners:
+            try:
+                callback(added, removed)
+            except Exception as e:
+                my_logger.error('### Unexpected Presence Callback Error Occured, Dropping Session ###')
+                my_logger.error(e)
+                self.unsubscribe(session_id)
+
+    '''Subscribe Session Function'''
+    def subscribe(self, session_id, callback):
+        '''Register callback(added, removed) and return the current online snapshot'''
+        with self.lock:
+            self.listeners[session_id] = callback
+            return dict(self.online)
+
+    '''Unsubscribe Session Function'''
+    def unsubscribe(self, session_id):
+        with self.lock:
+            self.listeners.pop(session_id, None)
+
+    '''Presence Stats Function'''
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            return {
+                'online': len(self.online),
+                'subscriptions': len(self.listeners),
+                'changes': self.changes,
+                'avg_latency': sum(latencies) / len(latencies) if latencies else 0.0,
+                'p95_latency': latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+                'max_latency': latencies[-1] if latencies else 0.0,
+            }
+
+'''ZeroTier Member Cache Class'''
+class member_cache:
+    '''Single server-level copy of the ZeroTier member list, refreshed by one poller thread, only the leading worker calls ZeroTier'''
+    def __init__(self, zt_net_id, zt_token, ttl=3, client=None, api_url='https://api.zerotier.com/api/v1', state=None, leader=None):
+        self.url = api_url + '/network/' + str(zt_net_id) + '/member'
+        self.headers = {'Authorization' : 'Bearer ' + str(zt_token)}
+        self.enabled = bool(zt_net_id and zt_token)
+        self.ttl = ttl
+        self.client = client or remoteDAQ_Client.get_client()
+        self.members = []
+        self.presence = presence_tracker()
+        self.state = state
+        self.leader = leader
+        self.published = None
+        self.etag = None
+        self.fetched_at = 0.0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.poller = None
+        self.poll_seconds = remoteDAQ_Metrics.get_registry().histogram('remotedaq_zerotier_poll_seconds', 'ZeroTier member list refresh duration by HTTP status', ['status'])
+
+    '''Refresh Member List Function'''
+    def refresh(self, force=False):
+        if not self.enabled:
+            return self.members
+        with self.lock:
+            if not force and time.monotonic() - self.fetched_at < self.ttl:
+                return self.members
+            headers = dict(self.headers)
+            if self.etag:
+                headers['If-None-Match'] = self.etag
+            start = time.perf_counter()
+            status, response_headers, result = self.client.run(self.client.fetch(self.url, headers=headers))
+            self.poll_seconds.labels(str(status)).observe(time.perf_counter() - start)
+            if status == 304:
+                self.fetched_at = time.monotonic()
+            elif status == 200 and isinstance(result, list):
+                self.members = [r for r in result if search('node', r.get('name') or '')]
+                self.etag = response_headers.get('ETag')
+                self.fetched_at = time.monotonic()
+            else:
+                my_logger.error('### Failed to Refresh ZeroTier Member List ###', extra={'endpoint': remoteDAQ_Client.endpoint_key(self.url), 'latency': round(time.perf_counter() - start, 4)})
+            return self.members
+
+    '''Get Cached Member List Function'''
+    def get_members(self):
+        if self.poller is None:
+            return self.refresh()
+        return self.members
+
+    '''Poller Thread Function'''
+    def poll(self):
+        while not self.stop_event.is_set():
+            try:
+                members = self.sync()
+                self.presence.update(members)
+                self.client.node_presence({r['config']['ipAssignments'][0]: isOnline(r['lastSeen']) for r in members if r['config']['ipAssignments']})
+            except Exception as e:
+                my_logger.error('### Unexpected ZeroTier Poller Error Occured ###')
+                my_logger.error(e)
+            self.stop_event.wait(self.ttl)
+
+    '''Sync Shared Member List Function'''
+    def sync(self):
+        '''The leader refreshes from ZeroTier and publishes the list, other workers read the published list'''
+        if self.state is None or self.leader is None or self.leader.is_leader:
+            members = self.refresh(force=True)
+            if self.state is not None and members is not self.published:
+                self.state.set('zerotier', 'members', members)
+                self.published = members
+            return members
+        members = self.state.get('zerotier', 'members')
+        if members is not None:
+            self.members = members
+        self.published = None
+        return self.members
+
+    '''Start Poller Function'''
+    def start(self):
+        if self.enabled and self.poller is None:
+            self.poller = threading.Thread(target=self.poll, name='RemoteDAQ_ZT_Poller', daemon=True)
+            self.poller.start()
+
+    '''Stop Poller Function'''
+    def stop(self):
+        self.stop_event.set()
+
+    '''Metrics Collector Function'''
+    def collect(self):
+        presence = self.presence.stats()
+        return [
+            ('remotedaq_zerotier_members', 'Cached ZeroTier members named as nodes', {}, len(self.members)),
+            ('remotedaq_nodes_online', 'Nodes seen within the last 90 seconds', {}, presence['online']),
+            ('remotedaq_presence_subscriptions', 'Sessions subscribed to presence changes', {}, presence['subscriptions']),
+            ('remotedaq_presence_p95_latency_seconds', 'Delay between a node changing state and the dashboard seeing it', {}, presence['p95_latency']),
+        ]
+
+'''Shared Cache Instance'''
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_member_cache() -> member_cache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = member_cache(
+                getenv('ZT_NET_ID'),
+                getenv('ZT_TOKEN'),
+                ttl=float(getenv('ZT_CACHE_TTL', 3)),
+                api_url=getenv('ZT_API_URL', 'https://api.zerotier.com/api/v1'),
+                state=remoteDAQ_State.get_state(),
+                leader=remoteDAQ_State.get_leader(),
+            )
+            _cache.start()
+            remoteDAQ_Metrics.get_registry().collector(_cache.collect)
+        return _cache
@@ -0,0 +1,103 @@
+import base64
+import time
+from bisect import bisect_right
+
+'''Series Colors'''
+COLORS = ['#00897B', '#E53935', '#1E88E5', '#FDD835', '#8E24AA', '#FB8C00', '#43A047', '#6D4C41']
+
+'''Largest Triangle Three Buckets Function'''
+def lttb(points, threshold):
+    '''Downsample [(t, v)] to at most threshold points keeping the visual shape'''
+    if threshold >= len(points) or threshold < 3:
+        return points
+    sampled = [points[0]]
+    every = (len(points) - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int((i + 1) * every) + 1
+        end = min(int((i + 2) * every) + 1, len(points))
+        avg_t = sum(p[0] for p in points[start:end]) / (end - start)
+        avg_v = sum(p[1] for p in points[start:end]) / (end - start)
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        at, av = points[a]
+        best, best_area = range_start, -1
+        for j in range(range_start, range_end):
+            area = abs((at - avg_t) * (points[j][1] - av) - (at - points[j][0]) * (avg_v - av))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
+
+'''Chart Decimator Class'''
+class chart_decimator:
+    '''Incrementally folds new buffer samples into min/max buckets cached per channel and zoom level'''
+    def __init__(self, buffer, points=600):
+        self.buffer = buffer
+        self.points = points
+        self.levels = {}
+
+    '''Update Level Function'''
+    def update(self, channel, window, now):
+        key = (channel, window)
+        if key not in self.levels:
+            self.levels[key] = {'width': max(window // self.points, 1), 'buckets': {}, 'last': 0}
+        level = self.levels[key]
+        width = level['width']
+        buckets = level['buckets']
+        with self.buffer.lock:
+            first = bisect_right(self.buffer.timestamps, level['last'])
+            timestamps = self.buffer.timestamps[first:]
+            values = self.buffer.channels[channel][first:]
+        for t, v in zip(timestamps, values):
+            b = t // width
+            bucket = buckets.get(b)
+            if bucket is None:
+                buckets[b] = [t, v, t, v]
+            elif v < bucket[1]:
+                bucket[0], bucket[1] = t, v
+            elif v > bucket[3]:
+                bucket[2], bucket[3] = t, v
+        if timestamps:
+            level['last'] = timestamps[-1]
+        oldest = (now - window) // width
+        for b in [b for b in buckets if b < oldest]:
+            del buckets[b]
+        return level
+
+    '''Series Function'''
+    def series(self, channel, window, now=None):
+        '''Return at most points (t, v) pairs covering the last window nanoseconds'''
+        now = now or time.time_ns()
+        level = self.update(channel, window, now)
+        points = []
+        for b in sorted(level['buckets']):
+            min_t, min_v, max_t, max_v = level['buckets'][b]
+            if min_t == max_t:
+                points.append((min_t, min_v))
+            else:
+                points.extend(sorted([(min_t, min_v), (max_t, max_v)]))
+        return lttb(points, self.points)
+
+'''SVG Chart Function'''
+def svg_chart(series, start, end, low=0.0, high=5.0, width=800, height=300):
+    '''Render {channel: [(t, v)]} as an SVG line chart between start and end nanoseconds'''
+    span_t = (end - start) or 1
+    span_v = (high - low) or 1
+    lines = []
+    for channel, points in series.items():
+        if not points:
+            continue
+        coords = ' '.join('{:.1f},{:.1f}'.format(
+            (t - start) / span_t * width,
+            height - (min(max(v, low), high) - low) / span_v * height,
+        ) for t, v in points)
+        lines.append('<polyline fill="none" stroke="{}" stroke-width="1.5" points="{}"/>'.format(COLORS[channel % len(COLORS)], coords))
+    grid = ''.join('<line x1="0" x2="{w}" y1="{y:.1f}" y2="{y:.1f}" stroke="#DDDDDD"/>'.format(w=width, y=height * i / 5) for i in range(6))
+    return '<svg xmlns="http://www.w3.org/2000/svg" width="{w}" height="{h}" viewBox="0 0 {w} {h}">{}{}</svg>'.format(grid, ''.join(lines), w=width, h=height)
+
+'''SVG Base64 Function'''
+def svg_base64(svg):
+    return base64.b64encode(svg.encode('utf-8')).decode('ascii')
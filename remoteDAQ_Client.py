@@ -0,0 +1,460 @@
+import aiohttp
+import asyncio
+import atexit
+import functools
+import itertools
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+from os import getenv
+from re import sub
+from urllib.parse import urlsplit, urlunsplit
+import remoteDAQ_Breaker
+import remoteDAQ_Metrics
+
+'''Logger Config'''
+my_logger = logging.getLogger('RemoteDAQ_Server')
+
+'''Endpoint Key Function'''
+def endpoint_key(url):
+    '''Collapse ZeroTier network and member IDs so every node shares one key per endpoint path'''
+    return sub(r'/[0-9a-f]{10,16}(?=/|$)', '/{id}', urlsplit(url).path)
+
+'''Log Fields Function'''
+def log_fields(url, latency=None):
+    '''Structured node and endpoint fields for log records about a request'''
+    fields = {'node': urlsplit(url).hostname, 'endpoint': endpoint_key(url)}
+    if latency is not None:
+        fields['latency'] = round(latency, 4)
+    return fields
+
+'''Node Read Cache Config'''
+READ_ENDPOINTS = ('/analog/input', '/digital/input', '/digital_output/input')
+READBACK = {'/analog/output': '/analog/input', '/digital/output': '/digital_output/input'}
+NODE_ENDPOINTS = READ_ENDPOINTS + tuple(READBACK)
+PROBE_ENDPOINT = '/digital_output/input'
+
+'''Node Host Function'''
+def node_host(url):
+    '''Node address of a node API URL, None for any other URL'''
+    parts = urlsplit(url)
+    return parts.hostname if parts.path in NODE_ENDPOINTS else None
+
+'''Node Read Cache Class'''
+class read_cache:
+    '''Per node and endpoint read results, fresh ones are reused and concurrent identical reads share one in-flight request'''
+    def __init__(self, max_age=0.0):
+        self.max_age = max_age
+        self.entries = {}
+        self.inflight = {}
+        self.generation = {}
+        metrics = remoteDAQ_Metrics.get_registry()
+        self.requests = metrics.counter('remotedaq_node_cache_requests_total', 'Node input reads by cache result', ['result'])
+        self.invalidations = metrics.counter('remotedaq_node_cache_invalidations_total', 'Cached node reads dropped by an output write', ['endpoint'])
+
+    '''Cached Read Function'''
+    async def read(self, url, fetch, max_age=None):
+        '''max_age=0 skips stored results but still joins a request already in flight'''
+        max_age = self.max_age if max_age is None else max_age
+        loop = asyncio.get_running_loop()
+        entry = self.entries.get(url)
+        if max_age > 0 and entry and loop.time() - entry[0] <= max_age:
+            self.requests.labels('hit').inc()
+            return entry[1]
+        task = self.inflight.get(url)
+        if task:
+            self.requests.labels('coalesced').inc()
+            return await asyncio.shield(task)
+        self.requests.labels('miss').inc()
+        task = loop.create_task(fetch())
+        self.inflight[url] = task
+        task.add_done_callback(functools.partial(self.store, url, self.generation.get(url, 0)))
+        return await asyncio.shield(task)
+
+    '''Store Result Function'''
+    def store(self, url, generation, task):
+        if self.inflight.get(url) is task:
+            del self.inflight[url]
+        if task.cancelled() or task.exception() or generation != self.generation.get(url, 0):
+            return
+        result = task.result()
+        if isinstance(result, dict) and result.get('success') == True:
+            self.entries[url] = (task.get_loop().time(), result)
+
+    '''Invalidate Readback Function'''
+    def invalidate(self, url):
+        '''Drop the stored and in-flight read that a write to url makes stale'''
+        parts = urlsplit(url)
+        endpoint = READBACK.get(parts.path)
+        if endpoint is None:
+            return
+        read_url = urlunsplit(parts._replace(path=endpoint))
+        self.generation[read_url] = self.generation.get(read_url, 0) + 1
+        self.entries.pop(read_url, None)
+        self.inflight.pop(read_url, None)
+        self.invalidations.labels(endpoint).inc()
+
+    '''Cache Stats Function'''
+    def stats(self):
+        counts = {result: child.value for (result,), child in list(self.requests.children.items())}
+        return {
+            'entries': len(self.entries),
+            'inflight': len(self.inflight),
+            'hit': counts.get('hit', 0),
+            'miss': counts.get('miss', 0),
+            'coalesced': counts.get('coalesced', 0),
+        }
+
+'''API Client Class'''
+class api_client:
+    '''Owns one event loop thread and one pooled aiohttp session for the whole server process'''
+    def __init__(self, limit=100, limit_per_host=8, keepalive=30, timeout=30, slow_request=5, read_max_age=0.0, breakers=None):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.slow_request = slow_request
+        self.loop = asyncio.new_event_loop()
+        self.session = None
+        metrics = remoteDAQ_Metrics.get_registry()
+        self.latency = metrics.histogram('remotedaq_api_request_seconds', 'API request latency by endpoint', ['endpoint'])
+        self.errors = metrics.counter('remotedaq_api_request_errors_total', 'API requests answered with success false', ['endpoint'])
+        self.reads = read_cache(read_max_age)
+        self.breakers = breakers or remoteDAQ_Breaker.breaker_registry(max_timeout=timeout)
+        self.pending = {}
+        self.request_ids = itertools.count(1)
+        self.callbacks = ThreadPoolExecutor(max_workers=4, thread_name_prefix='RemoteDAQ_Callback')
+        self.blocking = ThreadPoolExecutor(max_workers=8, thread_name_prefix='RemoteDAQ_Blocking')
+        self.thread = threading.Thread(target=self.run_loop, name='RemoteDAQ_API_Loop', daemon=True)
+        self.thread.start()
+        self.run(self.open_session())
+
+    '''Event Loop Thread Function'''
+    def run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    '''Open Pooled Session Function'''
+    async def open_session(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive,
+            ttl_dns_cache=300,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+
+    '''Run Coroutine on Client Loop Function'''
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    '''Run Coroutine and Wait Function'''
+    def run(self, coro):
+        return self.submit(coro).result()
+
+    '''Record Latency Function'''
+    def record(self, url, seconds, result=None):
+        key = endpoint_key(url)
+        self.latency.labels(key).observe(seconds)
+        if isinstance(result, dict) and result.get('success') is False:
+            self.errors.labels(key).inc()
+
+    '''Latency Stats Function'''
+    def latency_stats(self):
+        return {key: histogram.snapshot() for (key,), histogram in list(self.latency.children.items())}
+
+    '''Metrics Collector Function'''
+    def collect(self):
+        return [
+            ('remotedaq_api_pending_requests', 'Posted requests not finished yet', {}, len(self.pending)),
+            ('remotedaq_queue_depth', 'Work waiting in server queues', {'queue': 'api_callbacks'}, self.callbacks._work_queue.qsize()),
+            ('remotedaq_queue_depth', 'Work waiting in server queues', {'queue': 'api_blocking'}, self.blocking._work_queue.qsize()),
+            ('remotedaq_node_cache_entries', 'Node reads held in the read cache', {}, len(self.reads.entries)),
+        ] + self.breakers.collect()
+
+    '''API Requests Function'''
+    async def api_request(self, url, payload=None, headers=None, max_age=None) -> dict:
+        '''Node input reads go through the read cache, writes invalidate their readback endpoint'''
+        if payload is None and urlsplit(url).path in READ_ENDPOINTS:
+            return await self.reads.read(url, functools.partial(self.timed_request, url, None, headers), max_age)
+        result = await self.timed_request(url, payload, headers)
+        if payload is not None:
+            self.reads.invalidate(url)
+        return result
+
+    '''Timed Request Function'''
+    async def timed_request(self, url, payload=None, headers=None) -> dict:
+        host = node_host(url)
+        if host:
+            rejected = self.breakers.allow(host, url)
+            if rejected:
+                return rejected
+        start = time.perf_counter()
+        result = await self.send_request(url, payload=payload, headers=headers)
+        latency = time.perf_counter() - start
+        self.record(url, latency, result)
+        if latency > self.slow_request:
+            my_logger.warning('### Slow RemoteDAQ API Call ###', extra=log_fields(url, latency))
+        return result
+
+    '''Send Function'''
+    async def send(self, url, payload=None, headers=None, timeout=None):
+        '''Return the json body, raise on any failure'''
+        headers = dict(headers or {})
+        headers['Content-Type'] = 'application/json'
+        options = {'timeout': timeout} if timeout else {}
+        if payload:
+            async with self.session.post(url, data=json.dumps(payload), headers=headers, **options) as response:
+                return await response.json()
+        async with self.session.get(url, headers=headers, **options) as response:
+            return await response.json()
+
+    '''Node Timeout Function'''
+    def node_timeout(self, host):
+        '''Connect and read timeouts from the node's recent latency, the pool wait stays under the flat total timeout'''
+        if not host:
+            return None
+        seconds = self.breakers.get(host).timeout()
+        return aiohttp.ClientTimeout(total=self.timeout, sock_connect=seconds, sock_read=seconds)
+
+    '''Send Request Function'''
+    async def send_request(self, url, payload=None, headers=None) -> dict:
+        host = node_host(url)
+        start = time.perf_counter()
+        try:
+            result = await self.send(url, payload=payload, headers=headers, timeout=self.node_timeout(host))
+            if host:
+                self.breakers.success(host, time.perf_counter() - start)
+            return result
+        except aiohttp.ClientConnectorError as e:
+            self.node_failed(host, url, e)
+            my_logger.error('### Failed to Connect ###', extra=log_fields(url))
+            return {'success':False, 'data':['Connection refused, check connection']}
+        except aiohttp.ContentTypeError:
+            if host:
+                self.breakers.success(host, time.perf_counter() - start)
+            my_logger.error('### Return Type Error ###', extra=log_fields(url))
+            return {'success':False, 'data':['Invalid token or network ID, please check again']}
+        except asyncio.TimeoutError as e:
+            latency = time.perf_counter() - start
+            self.node_failed(host, url, e)
+            my_logger.error('### RemoteDAQ API Call Timed Out ###', extra=log_fields(url, latency))
+            return {'success':False, 'data':['No response after {:.1f} s, check connection'.format(latency)]}
+        except Exception as e:
+            self.node_failed(host, url, e)
+            my_logger.error('### Unexpected RemoteDAQ API Call Error Occured ###', extra=log_fields(url))
+            my_logger.error(e, extra=log_fields(url))
+            return {'success':False, 'data':['Unexpected error, Error message: ' + str(e)]}
+
+    '''Node Failed Function'''
+    def node_failed(self, host, url, error):
+        if host and self.breakers.failure(host, error):
+            self.start_probe(host)
+
+    '''Start Probe Function'''
+    def start_probe(self, host):
+        breaker = self.breakers.get(host)
+        if breaker.url and (breaker.probe_task is None or breaker.probe_task.done()):
+            breaker.probe_task = self.loop.create_task(self.probe(host, breaker.url))
+
+    '''Node Probe Function'''
+    async def probe(self, host, url):
+        '''Retry an unreachable node in the background with backoff until it answers, which closes its circuit'''
+        breaker = self.breakers.get(host)
+        probe_url = urlunsplit(urlsplit(url)._replace(path=PROBE_ENDPOINT, query=''))
+        while breaker.open:
+            await self.breakers.wait_probe(host)
+            if not breaker.open:
+                break
+            start = time.perf_counter()
+            try:
+                await self.send(probe_url, timeout=self.node_timeout(host))
+                self.breakers.success(host, time.perf_counter() - start)
+            except aiohttp.ContentTypeError:
+                self.breakers.success(host, time.perf_counter() - start)
+            except Exception as e:
+                self.breakers.failure(host, e)
+
+    '''Node Presence Function'''
+    def node_presence(self, nodes):
+        '''Feed ZeroTier {node_ip: online} into the node circuits, safe to call from any thread'''
+        self.loop.call_soon_threadsafe(self.update_presence, dict(nodes))
+
+    '''Update Presence Function'''
+    def update_presence(self, nodes):
+        for host, online in nodes.items():
+            if self.breakers.presence(host, online):
+                self.start_probe(host)
+
+    '''Conditional GET Function'''
+    async def fetch(self, url, headers=None):
+        '''Return (status, response headers, json body), body is None on 304 or failure'''
+        try:
+            async with self.session.get(url, headers=headers) as response:
+                if response.status == 304:
+                    return response.status, response.headers, None
+                return response.status, response.headers, await response.json()
+        except Exception as e:
+            my_logger.error('### Unexpected RemoteDAQ API Call Error Occured ###')
+            my_logger.error(e)
+            return None, {}, None
+
+    '''Raw POST Function'''
+    async def post_raw(self, url, data, headers=None):
+        '''Return (status, response text), status is None on connection failure'''
+        try:
+            async with self.session.post(url, data=data, headers=headers) as response:
+                return response.status, await response.text()
+        except Exception as e:
+            my_logger.error('### Unexpected RemoteDAQ API Call Error Occured ###')
+            my_logger.error(e)
+            return None, str(e)
+
+    '''Streaming POST Function'''
+    async def stream_post(self, url, data, headers=None, chunk_size=65536):
+        '''Yield the response body in chunks, only the gap between chunks is bounded by the request timeout'''
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout)
+        async with self.session.post(url, data=data, headers=headers, timeout=timeout) as response:
+            if response.status != 200:
+                raise RuntimeError('HTTP {}: {}'.format(response.status, (await response.text())[:500]))
+            async for chunk in response.content.iter_chunked(chunk_size):
+                yield chunk
+
+    '''Node Stream Function'''
+    async def node_stream(self, url, receive_timeout=10, heartbeat=15):
+        '''Yield frames from a node WebSocket carrying newline-delimited JSON, return when the node closes it, raise when it breaks'''
+        host = urlsplit(url).hostname
+        ws = await asyncio.wait_for(self.session.ws_connect(url, heartbeat=heartbeat), self.breakers.get(host).timeout())
+        try:
+            while True:
+                message = await ws.receive(timeout=receive_timeout)
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    data = message.data
+                elif message.type == aiohttp.WSMsgType.BINARY:
+                    data = message.data.decode('utf-8')
+                elif message.type == aiohttp.WSMsgType.ERROR:
+                    raise ws.exception()
+                else:
+                    return
+                for line in data.splitlines():
+                    if line:
+                        yield json.loads(line)
+        finally:
+            await ws.close()
+
+    '''Synchronous API Requests Function'''
+    def request(self, url, payload=None, headers=None) -> dict:
+        return self.run(self.api_request(url, payload=payload, headers=headers))
+
+    '''Deadline Guard Function'''
+    async def with_deadline(self, coro, deadline):
+        if not deadline:
+            return await coro
+        try:
+            return await asyncio.wait_for(coro, deadline)
+        except asyncio.TimeoutError:
+            my_logger.error('### Request Deadline Exceeded ###')
+            return {'success':False, 'data':['Request deadline of {} s exceeded'.format(deadline)]}
+
+    '''Post Work Function'''
+    def post(self, coro, callback=None, deadline=None):
+        '''Schedule a coroutine on the client loop, return a request ID, callback(result) runs off the loop'''
+        request_id = next(self.request_ids)
+        future = self.submit(self.with_deadline(coro, deadline))
+        self.pending[request_id] = future
+        future.add_done_callback(functools.partial(self.finish, request_id, callback))
+        return request_id
+
+    '''Post Request Function'''
+    def post_request(self, url, payload=None, headers=None, callback=None, deadline=None):
+        return self.post(self.api_request(url, payload=payload, headers=headers), callback=callback, deadline=deadline)
+
+    '''Post Blocking Function'''
+    def post_blocking(self, fn, *args, callback=None, deadline=None, **kwargs):
+        '''Run a blocking function such as an SSH call on the blocking pool through the same request flow'''
+        return self.post(self.run_blocking(fn, *args, **kwargs), callback=callback, deadline=deadline)
+
+    '''Run Blocking Function'''
+    async def run_blocking(self, fn, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.blocking, functools.partial(fn, *args, **kwargs))
+
+    '''Finish Request Function'''
+    def finish(self, request_id, callback, future):
+        self.pending.pop(request_id, None)
+        if callback is None:
+            return
+        try:
+            result = future.result()
+        except (CancelledError, asyncio.CancelledError):
+            return
+        except Exception as e:
+            my_logger.error('### Unexpected Posted Request Error Occured ###')
+            my_logger.error(e)
+            result = {'success':False, 'data':['Unexpected error, Error message: ' + str(e)]}
+        self.callbacks.submit(self.run_callback, callback, result)
+
+    '''Run Callback Function'''
+    def run_callback(self, callback, result):
+        try:
+            callback(result)
+        except Exception as e:
+            my_logger.error('### Unexpected Request Callback Error Occured ###')
+            my_logger.error(e)
+
+    '''Cancel Request Function'''
+    def cancel(self, request_id):
+        future = self.pending.pop(request_id, None)
+        if future:
+            return future.cancel()
+        return False
+
+    '''Stop Probes Function'''
+    async def stop_probes(self):
+        tasks = [b.probe_task for b in list(self.breakers.nodes.values()) if b.probe_task and not b.probe_task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    '''Close Client Function'''
+    def close(self):
+        '''Cancel node probes before the session closes and the loop stops, so none is left pending'''
+        self.run(self.stop_probes())
+        if self.session and not self.session.closed:
+            self.run(self.session.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.callbacks.shutdown(wait=False)
+        self.blocking.shutdown(wait=False)
+
+'''Shared Client Instance'''
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> api_client:
+    global _client
+    with _client_lock:
+        if _client is None:
+            timeout = float(getenv('API_REQUEST_TIMEOUT', 30))
+            _client = api_client(
+                limit=int(getenv('API_POOL_LIMIT', 100)),
+                limit_per_host=int(getenv('API_POOL_LIMIT_PER_HOST', 8)),
+                keepalive=float(getenv('API_POOL_KEEPALIVE', 30)),
+                timeout=timeout,
+                slow_request=float(getenv('API_SLOW_REQUEST', 5)),
+                read_max_age=float(getenv('NODE_CACHE_MAX_AGE', 0.25)),
+                breakers=remoteDAQ_Breaker.breaker_registry(
+                    failure_threshold=int(getenv('NODE_FAILURE_THRESHOLD', 3)),
+                    initial_timeout=float(getenv('NODE_TIMEOUT_INITIAL', 5)),
+                    min_timeout=float(getenv('NODE_TIMEOUT_MIN', 1)),
+                    max_timeout=timeout,
+                    factor=float(getenv('NODE_TIMEOUT_FACTOR', 3)),
+                    max_retry=float(getenv('NODE_RETRY_MAX', 60)),
+                ),
+            )
+            atexit.register(_client.close)
+            remoteDAQ_Metrics.get_registry().collector(_client.collect)
+        return _client
@@ -0,0 +1,340 @@
+import calendar
+import csv
+import datetime
+import hashlib
+import hmac
+import io
+import json
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from os import getenv
+from urllib.parse import urlencode
+from aiohttp import web
+import remoteDAQ_Client
+import remoteDAQ_Metrics
+from remoteDAQ_Ingest import MEASUREMENTS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+'''Logger Config'''
+my_logger = logging.getLogger('RemoteDAQ_Server')
+
+'''Export Formats'''
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+AGGREGATES = ('mean', 'min', 'max', 'last')
+RELATIVE = re.compile(r'^-(\d+)([smhdw])$')
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+'''Parse Time Function'''
+def parse_time(value, now=None):
+    '''Accept -30m style offsets, RFC3339 or epoch seconds, return epoch seconds'''
+    now = now or time.time()
+    value = str(value).strip()
+    match = RELATIVE.match(value)
+    if match:
+        return now - int(match.group(1)) * UNITS[match.group(2)]
+    if value == 'now()' or value == 'now':
+        return now
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+'''Parse Influx Timestamp Function'''
+def parse_influx_time(value):
+    '''RFC3339 with up to nanosecond fraction to epoch nanoseconds'''
+    seconds, _, fraction = value.rstrip('Z').partition('.')
+    whole = calendar.timegm(time.strptime(seconds, '%Y-%m-%dT%H:%M:%S'))
+    return whole * 10**9 + int((fraction + '000000000')[:9])
+
+'''Flux String Function'''
+def flux_string(value):
+    '''Quoted Flux string literal, $ is escaped too so ${...} is never interpolated'''
+    return json.dumps(str(value)).replace('$', '\\$')
+
+'''RFC3339 Function'''
+def rfc3339(seconds):
+    return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+'''Chunk Sink Class'''
+class chunk_sink:
+    '''File-like buffer pyarrow writers write into, drained after every batch'''
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+'''History Query Service Class'''
+class history_service:
+    '''Queries InfluxDB with downsampling pushed into Flux, caches small view results and streams exports chunk by chunk'''
+    def __init__(self, url, org, bucket, token, cache_size=32, max_points=2000, raw_span=3600, batch_rows=50000, client=None,
+                 secret=None, link_ttl=300):
+        self.query_url = (url or '').rstrip('/') + '/api/v2/query?' + urlencode({'org': org or ''})
+        self.bucket = bucket
+        self.headers = {'Authorization': 'Token ' + str(token), 'Content-Type': 'application/json', 'Accept': 'application/csv'}
+        self.enabled = bool(url and org and bucket and token)
+        self.cache_size = cache_size
+        self.max_points = max_points
+        self.raw_span = raw_span
+        self.batch_rows = batch_rows
+        self.secret = str(secret or token or '').encode('utf-8')
+        self.link_ttl = link_ttl
+        self.client = client or remoteDAQ_Client.get_client()
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        metrics = remoteDAQ_Metrics.get_registry()
+        self.cache_requests = metrics.counter('remotedaq_history_cache_requests_total', 'History view queries by cache result', ['result'])
+        self.export_rows = metrics.counter('remotedaq_history_export_rows_total', 'Rows streamed by history exports', ['format'])
+
+    '''Aggregation Window Function'''
+    def window(self, start, stop, every=None):
+        '''Seconds per aggregateWindow bucket, None keeps raw points'''
+        if every == 'raw':
+            return None
+        if every:
+            return max(int(every), 1)
+        if stop - start <= self.raw_span:
+            return None
+        return max(math.ceil((stop - start) / self.max_points), 1)
+
+    '''Build Flux Query Function'''
+    def build_query(self, node, endpoint, pins, start, stop, every=None, fn='mean'):
+        lines = [
+            'from(bucket: {})'.format(flux_string(self.bucket)),
+            '  |> range(start: {}, stop: {})'.format(rfc3339(start), rfc3339(stop)),
+            '  |> filter(fn: (r) => r._measurement == {} and r.node == {} and r._field == "value")'.format(
+                flux_string(MEASUREMENTS[endpoint]), flux_string(node)),
+        ]
+        if pins:
+            lines.append('  |> filter(fn: (r) => contains(value: r.pin, set: {}))'.format(json.dumps([str(p) for p in pins])))
+        if every:
+            lines.append('  |> aggregateWindow(every: {}s, fn: {}, createEmpty: false)'.format(int(every), fn))
+        lines.append('  |> keep(columns: ["_time", "pin", "_value"])')
+        return '\n'.join(lines)
+
+    '''Stream Rows Function'''
+    async def rows(self, flux):
+        '''Yield lists of (RFC3339 time, pin, value string) rows as the annotated CSV response arrives'''
+        body = json.dumps({'query': flux, 'type': 'flux', 'dialect': {'header': True, 'annotations': []}})
+        columns = None
+        rest = b''
+        async for chunk in self.client.stream_post(self.query_url, body, headers=self.headers):
+            lines = (rest + chunk).split(b'\n')
+            rest = lines.pop()
+            batch = []
+            for record in csv.reader(line.decode('utf-8').rstrip('\r') for line in lines):
+                if not record or not any(record):
+                    columns = None
+                elif columns is None:
+                    columns = (record.index('_time'), record.index('pin'), record.index('_value'))
+                else:
+                    batch.append((record[columns[0]], record[columns[1]], record[columns[2]]))
+            if batch:
+                yield batch
+        if rest.strip() and columns:
+            record = next(csv.reader([rest.decode('utf-8').rstrip('\r')]))
+            yield [(record[columns[0]], record[columns[1]], record[columns[2]])]
+
+    '''View Query Function'''
+    async def query(self, node, endpoint, pins, start, stop, every=None, fn='mean'):
+        '''Return {'success', 'every', 'start', 'stop', 'series': {pin: [(ns, value)]}} with at most max_points windows per pin, served from the LRU cache when possible'''
+        every = int(every) if every and every != 'raw' else max(math.ceil((stop - start) / self.max_points), 1)
+        start, stop = math.floor(start / every) * every, math.ceil(stop / every) * every
+        key = (node, endpoint, tuple(sorted(pins)), start, stop, every, fn)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.cache_requests.labels('hit').inc()
+                return self.cache[key]
+        self.cache_requests.labels('miss').inc()
+        series = {}
+        async for batch in self.rows(self.build_query(node, endpoint, pins, start, stop, every, fn)):
+            for t, pin, value in batch:
+                series.setdefault(int(pin), []).append((parse_influx_time(t), float(value)))
+        result = {'success': True, 'every': every, 'start': start, 'stop': stop, 'series': series}
+        with self.lock:
+            self.cache[key] = result
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return result
+
+    '''Export Parameters Function'''
+    def export_params(self, query):
+        node = query.get('node', '')
+        endpoint = query.get('endpoint', '/analog/input')
+        if not node or endpoint not in MEASUREMENTS:
+            raise ValueError('node and a valid input endpoint are required')
+        pins = [int(p) for p in query.get('pins', '').split(',') if p.strip()]
+        now = time.time()
+        start = parse_time(query.get('start', '-1h'), now)
+        stop = parse_time(query.get('stop', 'now'), now)
+        if stop <= start:
+            raise ValueError('stop must be after start')
+        fn = query.get('fn', 'mean')
+        if fn not in AGGREGATES:
+            raise ValueError('fn must be one of ' + ', '.join(AGGREGATES))
+        every = query.get('every') or 'raw'
+        if every != 'raw' and every != 'auto':
+            every = int(every)
+        fmt = query.get('format', 'csv')
+        if fmt not in FORMATS:
+            raise ValueError('format must be one of ' + ', '.join(FORMATS))
+        if fmt != 'csv' and pa is None:
+            raise ValueError('pyarrow is not installed, only csv export is available')
+        return node, endpoint, pins, start, stop, (None if every == 'auto' else every), fn, fmt
+
+    '''Export Signature Function'''
+    def signature(self, params):
+        message = urlencode(sorted((k, str(v)) for k, v in params.items() if k != 'sig'))
+        return hmac.new(self.secret, message.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    '''Sign Export Link Function'''
+    def sign(self, params):
+        '''Query string of an export link that stays valid for link_ttl seconds'''
+        params = dict(params, expires=int(time.time() + self.link_ttl))
+        params['sig'] = self.signature(params)
+        return urlencode(params)
+
+    '''Verify Export Link Function'''
+    def verify(self, query):
+        try:
+            expires = float(query.get('expires', 0))
+        except ValueError:
+            return False
+        if not self.secret or expires < time.time():
+            return False
+        return hmac.compare_digest(self.signature(query), query.get('sig', ''))
+
+    '''Export Handler Function'''
+    async def export(self, request):
+        '''GET /export?node=&endpoint=&pins=&start=&stop=&every=raw|auto|seconds&fn=&format=csv|arrow|parquet'''
+        if not self.enabled:
+            return web.Response(status=503, text='InfluxDB is not configured')
+        if not self.verify(request.query):
+            return web.Response(status=403, text='Export link is invalid or expired')
+        try:
+            node, endpoint, pins, start, stop, every, fn, fmt = self.export_params(request.query)
+        except ValueError as e:
+            return web.Response(status=400, text=str(e))
+        every = self.window(start, stop, every)
+        content_type, extension = FORMATS[fmt]
+        filename = '{}_{}_{}.{}'.format(re.sub(r'[^A-Za-z0-9_.-]', '_', node), MEASUREMENTS[endpoint], datetime.datetime.utcfromtimestamp(start).strftime('%Y%m%dT%H%M%S'), extension)
+        response = web.StreamResponse(headers={
+            'Content-Type': content_type,
+            'Content-Disposition': 'attachment; filename="{}"'.format(filename),
+        })
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        rows = 0
+        try:
+            if fmt == 'csv':
+                rows = await self.write_csv(response, self.build_query(node, endpoint, pins, start, stop, every, fn))
+            else:
+                rows = await self.write_arrow(response, self.build_query(node, endpoint, pins, start, stop, every, fn), fmt)
+        except Exception as e:
+            my_logger.error('### History Export Failed ###', extra={'node': node, 'endpoint': endpoint})
+            my_logger.error(e)
+            request.transport.close()
+            raise
+        self.export_rows.labels(fmt).inc(rows)
+        await response.write_eof()
+        return response
+
+    '''Write CSV Export Function'''
+    async def write_csv(self, response, flux):
+        await response.write(b'time,pin,value\n')
+        rows = 0
+        async for batch in self.rows(flux):
+            out = io.StringIO()
+            csv.writer(out, lineterminator='\n').writerows(batch)
+            await response.write(out.getvalue().encode('utf-8'))
+            rows += len(batch)
+        return rows
+
+    '''Write Arrow Export Function'''
+    async def write_arrow(self, response, flux, fmt):
+        schema = pa.schema([('time', pa.timestamp('ns', tz='UTC')), ('pin', pa.int8()), ('value', pa.float64())])
+        sink = chunk_sink()
+        writer = pa.ipc.new_stream(pa.PythonFile(sink, mode='w'), schema) if fmt == 'arrow' else pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema)
+        rows = 0
+        pending = []
+
+        async def write(pending):
+            table = pa.table({
+                'time': pa.array([parse_influx_time(t) for t, _, _ in pending], pa.timestamp('ns', tz='UTC')),
+                'pin': pa.array([int(p) for _, p, _ in pending], pa.int8()),
+                'value': pa.array([float(v) for _, _, v in pending], pa.float64()),
+            }, schema=schema)
+            writer.write_table(table)
+            await response.write(sink.drain())
+
+        async for batch in self.rows(flux):
+            pending.extend(batch)
+            rows += len(batch)
+            if len(pending) >= self.batch_rows:
+                await write(pending)
+                pending = []
+        if pending:
+            await write(pending)
+        writer.close()
+        await response.write(sink.drain())
+        return rows
+
+    '''Register Routes Function'''
+    def register(self, app):
+        app.router.add_get('/export', self.export)
+
+    '''History Stats Function'''
+    def stats(self):
+        with self.lock:
+            return {'cached_queries': len(self.cache)}
+
+'''Shared History Instance'''
+_history = None
+_history_lock = threading.Lock()
+
+def get_history() -> history_service:
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = history_service(
+                getenv('DB_IP', 'http://remotedaq_db:8086'),
+                getenv('DB_ORG'),
+                getenv('DB_BUCKET'),
+                getenv('DB_TOKEN'),
+                cache_size=int(getenv('HISTORY_CACHE_SIZE', 32)),
+                max_points=int(getenv('HISTORY_MAX_POINTS', 2000)),
+                raw_span=float(getenv('HISTORY_RAW_SPAN', 3600)),
+                secret=getenv('EXPORT_SECRET'),
+                link_ttl=float(getenv('EXPORT_LINK_TTL', 300)),
+            )
+        return _history
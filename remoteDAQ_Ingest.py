@@ -0,0 +1,207 @@
+import asyncio
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from os import getenv
+from urllib.parse import urlencode
+import remoteDAQ_Client
+import remoteDAQ_Metrics
+
+'''Logger Config'''
+my_logger = logging.getLogger('RemoteDAQ_Server')
+
+'''Measurement Names'''
+MEASUREMENTS = {
+    '/analog/input': 'analog_input',
+    '/digital/input': 'digital_input',
+    '/digital_output/input': 'digital_output_input',
+}
+
+'''Line Protocol Tag Escape Function'''
+def escape_tag(value):
+    return str(value).replace('\\', '\\\\').replace(',', '\\,').replace('=', '\\=').replace(' ', '\\ ')
+
+'''InfluxDB Writer Class'''
+class influx_writer:
+    '''Batches readings into line protocol and flushes them by size or time through the shared client'''
+    def __init__(self, url, org, bucket, token, batch_size=5000, flush_interval=1.0, retry_limit=20, client=None):
+        self.write_url = url.rstrip('/') + '/api/v2/write?' + urlencode({'org': org, 'bucket': bucket, 'precision': 'ns'})
+        self.headers = {'Authorization': 'Token ' + str(token), 'Content-Type': 'text/plain; charset=utf-8'}
+        self.enabled = bool(url and org and bucket and token)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.client = client or remoteDAQ_Client.get_client()
+        self.buffer = []
+        self.retry = deque()
+        self.retry_limit = retry_limit
+        self.lock = threading.Lock()
+        self.flusher = None
+        self.flush_scheduled = False
+        self.points_written = 0
+        self.points_dropped = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    '''Add Readings Function'''
+    def add(self, node, endpoint, api_response, timestamp=None):
+        '''Queue every pin of an input endpoint response, return the number of points queued'''
+        return self.add_values(node, endpoint, [r['value'] for r in api_response['data']], timestamp)
+
+    '''Add Pin Values Function'''
+    def add_values(self, node, endpoint, values, timestamp=None):
+        '''Queue one reading of every pin given as a plain list'''
+        if not self.enabled or endpoint not in MEASUREMENTS:
+            return 0
+        timestamp = timestamp or time.time_ns()
+        prefix = MEASUREMENTS[endpoint] + ',node=' + escape_tag(node) + ',pin='
+        suffix = ' ' + str(timestamp)
+        if endpoint == '/analog/input':
+            lines = [prefix + str(pin) + ' value=' + repr(float(v)) + suffix for pin, v in enumerate(values)]
+        else:
+            lines = [prefix + str(pin) + ' value=' + str(int(v)) + 'i' + suffix for pin, v in enumerate(values)]
+        return self.queue(lines)
+
+    '''Write Pin Samples Function'''
+    def write_points(self, node, endpoint, pin, timestamps, values):
+        '''Write a run of samples of one pin in batch_size requests from a non-loop thread, return how many InfluxDB acknowledged before a failure'''
+        if not self.enabled or endpoint not in MEASUREMENTS:
+            return 0
+        prefix = MEASUREMENTS[endpoint] + ',node=' + escape_tag(node) + ',pin=' + str(pin) + ' value='
+        if endpoint == '/analog/input':
+            lines = [prefix + repr(v) + ' ' + str(t) for t, v in zip(timestamps, values)]
+        else:
+            lines = [prefix + str(int(v)) + 'i ' + str(t) for t, v in zip(timestamps, values)]
+        written = 0
+        for i in range(0, len(lines), self.batch_size):
+            batch = lines[i:i + self.batch_size]
+            if not self.client.run(self.write(batch)):
+                break
+            written += len(batch)
+        return written
+
+    '''Queue Lines Function'''
+    def queue(self, lines):
+        '''Submit at most one flush for a full buffer, it is cleared again once that flush takes the buffer'''
+        with self.lock:
+            self.buffer.extend(lines)
+            full = len(self.buffer) >= self.batch_size and not self.flush_scheduled
+            if full:
+                self.flush_scheduled = True
+        if full:
+            self.client.submit(self.flush())
+        return len(lines)
+
+    '''Writer Healthy Function'''
+    def healthy(self):
+        '''True when the database is accepting writes and there is room to queue more'''
+        return self.enabled and not self.retry and len(self.buffer) < self.batch_size
+
+    '''Flush Buffer Function'''
+    async def flush(self):
+        with self.lock:
+            batch, self.buffer = self.buffer, []
+            self.flush_scheduled = False
+        if batch:
+            if not await self.write(batch):
+                self.queue_retry(batch)
+                return
+        while self.retry:
+            batch = self.retry.popleft()
+            if not await self.write(batch):
+                self.retry.appendleft(batch)
+                return
+
+    '''Write Batch Function'''
+    async def write(self, batch):
+        start = time.perf_counter()
+        status, text = await self.client.post_raw(self.write_url, '\n'.join(batch), headers=self.headers)
+        latency = time.perf_counter() - start
+        self.flushes += 1
+        self.last_flush_latency = latency
+        self.total_flush_latency += latency
+        if status == 204:
+            self.points_written += len(batch)
+            return True
+        self.failed_flushes += 1
+        my_logger.error('### Failed to Write Batch to InfluxDB ###')
+        my_logger.error(text)
+        return False
+
+    '''Queue Retry Batch Function'''
+    def queue_retry(self, batch):
+        self.retry.append(batch)
+        while len(self.retry) > self.retry_limit:
+            self.points_dropped += len(self.retry.popleft())
+
+    '''Flush Timer Loop Function'''
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                my_logger.error('### Unexpected InfluxDB Flush Error Occured ###')
+                my_logger.error(e)
+
+    '''Start Writer Function'''
+    def start(self):
+        if self.enabled and self.flusher is None:
+            self.flusher = self.client.submit(self.flush_loop())
+
+    '''Stop Writer Function'''
+    def stop(self):
+        if self.flusher:
+            self.flusher.cancel()
+            self.flusher = None
+        if self.enabled:
+            self.client.run(self.flush())
+
+    '''Metrics Collector Function'''
+    def collect(self):
+        return [
+            ('remotedaq_queue_depth', 'Work waiting in server queues', {'queue': 'influx_points'}, len(self.buffer)),
+            ('remotedaq_queue_depth', 'Work waiting in server queues', {'queue': 'influx_retry_batches'}, len(self.retry)),
+            ('remotedaq_influx_points_written', 'Points accepted by InfluxDB', {}, self.points_written),
+            ('remotedaq_influx_points_dropped', 'Points dropped after the retry queue overflowed', {}, self.points_dropped),
+            ('remotedaq_influx_failed_flushes', 'Batches InfluxDB did not accept', {}, self.failed_flushes),
+            ('remotedaq_influx_last_flush_seconds', 'Duration of the latest batch write', {}, self.last_flush_latency),
+        ]
+
+    '''Writer Stats Function'''
+    def stats(self):
+        return {
+            'points_written': self.points_written,
+            'points_dropped': self.points_dropped,
+            'points_buffered': len(self.buffer),
+            'retry_batches': len(self.retry),
+            'flushes': self.flushes,
+            'failed_flushes': self.failed_flushes,
+            'last_flush_latency': self.last_flush_latency,
+            'avg_flush_latency': self.total_flush_latency / self.flushes if self.flushes else 0.0,
+        }
+
+'''Shared Writer Instance'''
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer() -> influx_writer:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = influx_writer(
+                getenv('DB_IP', 'http://remotedaq_db:8086'),
+                getenv('DB_ORG'),
+                getenv('DB_BUCKET'),
+                getenv('DB_TOKEN'),
+                batch_size=int(getenv('DB_BATCH_SIZE', 5000)),
+                flush_interval=float(getenv('DB_FLUSH_INTERVAL', 1)),
+                retry_limit=int(getenv('DB_RETRY_LIMIT', 20)),
+            )
+            _writer.start()
+            atexit.register(_writer.stop)
+            remoteDAQ_Metrics.get_registry().collector(_writer.collect)
+        return _writer
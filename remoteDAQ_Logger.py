@@ -1,19 +1,110 @@
+import atexit
+import datetime
+import json
 import logging
-from logging.handlers import TimedRotatingFileHandler
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from os import getenv
 
 '''Log Config'''
-FORMATTER = logging.Formatter('%(asctime)s — %(name)s — %(levelname)s — %(message)s')
+FIELDS = ('node', 'endpoint', 'latency', 'suppressed')
+
+'''JSON Log Formatter Class'''
+class json_formatter(logging.Formatter):
+    '''One JSON object per line with the node, endpoint and latency fields passed through extra'''
+    def format(self, record):
+        data = {
+            'time': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'logger': record.name,
+            'level': record.levelname,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for field in FIELDS:
+            if hasattr(record, field):
+                data[field] = getattr(record, field)
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+'''Duplicate Log Filter Class'''
+class dedup_filter(logging.Filter):
+    '''Lets burst identical warnings or errors through per window, the next one after the window carries the suppressed count'''
+    def __init__(self, window=10.0, burst=3, max_keys=1000):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.max_keys = max_keys
+        self.seen = {}
+        self.suppressed = 0
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.levelno, record.getMessage(), getattr(record, 'node', None), getattr(record, 'endpoint', None))
+        now = time.monotonic()
+        with self.lock:
+            entry = self.seen.get(key)
+            if entry is None or now - entry[0] > self.window:
+                if entry and entry[2]:
+                    record.suppressed = entry[2]
+                self.seen[key] = [now, 1, 0]
+                if len(self.seen) > self.max_keys:
+                    self.seen = {k: v for k, v in self.seen.items() if now - v[0] <= self.window}
+                return True
+            if entry[1] < self.burst:
+                entry[1] += 1
+                return True
+            entry[2] += 1
+            self.suppressed += 1
+            return False
+
+'''Non-Blocking Queue Handler Class'''
+class nonblocking_handler(QueueHandler):
+    '''Never waits on a full queue, records that do not fit are counted and dropped'''
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
 '''Log File Handler'''
 def get_file_handler(logger_name):
-   file_handler = TimedRotatingFileHandler('logs/{}.log'.format(logger_name), when='midnight', backupCount=7)
-   file_handler.setFormatter(FORMATTER)
+   '''Workers started by the supervisor each rotate their own file'''
+   worker = getenv('WORKER_INDEX')
+   file_handler = TimedRotatingFileHandler('logs/{}{}.log'.format(logger_name, '-worker-' + worker if worker else ''), when='midnight', backupCount=7)
+   file_handler.setFormatter(json_formatter())
    return file_handler
 
+'''Shared Listeners'''
+_listeners = {}
+_listeners_lock = threading.Lock()
+
 '''Main Log Handler'''
 def get_logger(logger_name):
+   '''Callers only enqueue records, one listener thread per logger writes the file, handlers are attached once'''
    logger = logging.getLogger(logger_name)
-   logger.setLevel(logging.INFO)
-   logger.addHandler(get_file_handler(logger_name))
-   logger.propagate = False
-   return logger
\ No newline at end of file
+   with _listeners_lock:
+      if logger_name in _listeners:
+         return logger
+      log_queue = queue.Queue(maxsize=int(getenv('LOG_QUEUE_SIZE', 10000)))
+      handler = nonblocking_handler(log_queue)
+      handler.addFilter(dedup_filter(
+         window=float(getenv('LOG_DEDUP_WINDOW', 10)),
+         burst=int(getenv('LOG_DEDUP_BURST', 3)),
+      ))
+      listener = QueueListener(log_queue, get_file_handler(logger_name), respect_handler_level=True)
+      listener.start()
+      atexit.register(listener.stop)
+      _listeners[logger_name] = listener
+      logger.setLevel(logging.INFO)
+      logger.addHandler(handler)
+      logger.propagate = False
+   return logger
@@ -0,0 +1,265 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from os import getenv
+from aiohttp import web
+
+'''Logger Config'''
+my_logger = logging.getLogger('RemoteDAQ_Server')
+
+'''Latency Histogram Class'''
+class latency_histogram:
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float('inf'))
+
+    def __init__(self, buckets=None):
+        self.buckets = tuple(buckets or self.BUCKETS)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    '''Observe Latency Function'''
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    '''Timer Function'''
+    def time(self):
+        return histogram_timer(self)
+
+    '''Percentile Function'''
+    def percentile(self, q):
+        '''Upper bucket bound holding the q-th fraction of observations'''
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if count and seen >= target:
+                return bound
+        return 0.0
+
+    '''Histogram Snapshot Function'''
+    def snapshot(self):
+        return {
+            'buckets': dict(zip([str(b) for b in self.buckets], self.counts)),
+            'count': self.count,
+            'sum': self.sum,
+            'avg': self.sum / self.count if self.count else 0.0,
+        }
+
+'''Histogram Timer Class'''
+class histogram_timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+'''Counter Class'''
+class counter:
+    def __init__(self):
+        self.value = 0
+
+    '''Increment Function'''
+    def inc(self, amount=1):
+        self.value += amount
+
+'''Gauge Class'''
+class gauge(counter):
+    '''Set Value Function'''
+    def set(self, value):
+        self.value = value
+
+    '''Decrement Function'''
+    def dec(self, amount=1):
+        self.value -= amount
+
+'''Metric Family Class'''
+class metric_family:
+    '''One named metric with a child per label value combination'''
+    def __init__(self, name, kind, help, labelnames, factory):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.factory = factory
+        self.children = {}
+        self.lock = threading.Lock()
+
+    '''Labelled Child Function'''
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self.factory())
+        return child
+
+'''Escape Label Value Function'''
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+'''Format Labels Function'''
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, escape_label(v)) for k, v in labels.items()) + '}'
+
+'''Format Value Function'''
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+'''Metrics Registry Class'''
+class metrics_registry:
+    '''Holds hot-path counters and histograms plus collectors that read gauges only when metrics are scraped'''
+    def __init__(self):
+        self.families = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    '''Register Family Function'''
+    def family(self, name, kind, help, labelnames, factory):
+        with self.lock:
+            if name not in self.families:
+                self.families[name] = metric_family(name, kind, help, labelnames, factory)
+            return self.families[name]
+
+    '''Histogram Family Function'''
+    def histogram(self, name, help, labelnames=(), buckets=None):
+        return self.family(name, 'histogram', help, labelnames, lambda: latency_histogram(buckets))
+
+    '''Counter Family Function'''
+    def counter(self, name, help, labelnames=()):
+        return self.family(name, 'counter', help, labelnames, counter)
+
+    '''Gauge Family Function'''
+    def gauge(self, name, help, labelnames=()):
+        return self.family(name, 'gauge', help, labelnames, gauge)
+
+    '''Register Collector Function'''
+    def collector(self, fn):
+        '''fn() returns [(name, help, {label: value}, value)] gauges, called on every scrape'''
+        with self.lock:
+            self.collectors.append(fn)
+
+    '''Collect Gauges Function'''
+    def collect(self):
+        samples = []
+        with self.lock:
+            collectors = list(self.collectors)
+        for fn in collectors:
+            try:
+                samples.extend(fn())
+            except Exception as e:
+                my_logger.error('### Unexpected Metrics Collector Error Occured ###')
+                my_logger.error(e)
+        return samples
+
+    '''Prometheus Text Function'''
+    def render(self):
+        lines = []
+        with self.lock:
+            families = list(self.families.values())
+        for family in families:
+            lines.append('# HELP {} {}'.format(family.name, family.help))
+            lines.append('# TYPE {} {}'.format(family.name, family.kind))
+            for values, child in list(family.children.items()):
+                labels = dict(zip(family.labelnames, values))
+                if family.kind == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(child.buckets, child.counts):
+                        cumulative += count
+                        lines.append('{}_bucket{} {}'.format(family.name, format_labels(dict(labels, le=format_value(bound))), cumulative))
+                    lines.append('{}_sum{} {}'.format(family.name, format_labels(labels), format_value(child.sum)))
+                    lines.append('{}_count{} {}'.format(family.name, format_labels(labels), child.count))
+                else:
+                    lines.append('{}{} {}'.format(family.name, format_labels(labels), format_value(child.value)))
+        gauges = {}
+        for name, help, labels, value in self.collect():
+            if name not in gauges:
+                gauges[name] = ['# HELP {} {}'.format(name, help), '# TYPE {} gauge'.format(name)]
+            gauges[name].append('{}{} {}'.format(name, format_labels(labels), format_value(value)))
+        for samples in gauges.values():
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+    '''Health Summary Function'''
+    def summary(self):
+        '''Return [(metric, labels, value)] rows for the dashboard, histograms are shown as count, average and p95'''
+        rows = []
+        with self.lock:
+            families = list(self.families.values())
+        for family in families:
+            for values, child in sorted(family.children.items()):
+                labels = ', '.join('{}={}'.format(k, v) for k, v in zip(family.labelnames, values))
+                if family.kind == 'histogram':
+                    avg = child.sum / child.count if child.count else 0.0
+                    value = '{} obs, avg {:.1f} ms, p95 <= {} ms'.format(child.count, avg * 1000, format_value(child.percentile(0.95) * 1000))
+                else:
+                    value = format_value(child.value)
+                rows.append((family.name, labels, value))
+        for name, help, labels, value in self.collect():
+            rows.append((name, ', '.join('{}={}'.format(k, v) for k, v in labels.items()), format_value(value)))
+        return rows
+
+'''Metrics Server Class'''
+class metrics_server:
+    '''Serves the registry as Prometheus text on /metrics from the shared client event loop'''
+    def __init__(self, registry, client, host='0.0.0.0', port=9464):
+        self.registry = registry
+        self.client = client
+        self.host = host
+        self.port = port
+        self.app = web.Application()
+        self.app.router.add_get('/metrics', self.metrics)
+        self.runner = None
+
+    '''Metrics Handler Function'''
+    async def metrics(self, request):
+        return web.Response(text=self.registry.render(), content_type='text/plain', charset='utf-8', headers={'X-Content-Type-Options': 'nosniff'})
+
+    '''Serve Function'''
+    async def serve(self):
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+    '''Start Server Function'''
+    def start(self):
+        '''Routes added to app after this are ignored, METRICS_PORT=0 keeps the server closed'''
+        if self.runner or not self.port:
+            return
+        try:
+            self.client.run(self.serve())
+            my_logger.info('Metrics served on {}:{}/metrics'.format(self.host, self.port))
+        except OSError as e:
+            my_logger.error('### Failed to Start Metrics Server ###')
+            my_logger.error(e)
+
+'''Shared Registry Instance'''
+_registry = metrics_registry()
+
+def get_registry() -> metrics_registry:
+    return _registry
+
+'''Shared Server Instance'''
+_server = None
+_server_lock = threading.Lock()
+
+def get_server(client) -> metrics_server:
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = metrics_server(
+                _registry,
+                client,
+                host=getenv('METRICS_HOST', '0.0.0.0'),
+                port=int(getenv('METRICS_PORT', 9464)),
+            )
+        return _server
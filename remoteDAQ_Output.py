@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import remoteDAQ_Client
+from remoteDAQ_Acquisition import node_url
+
+'''Logger Config'''
+my_logger = logging.getLogger('RemoteDAQ_Server')
+
+'''Output Endpoints'''
+AO_ENDPOINT = '/analog/output'
+DO_ENDPOINT = '/digital/output'
+READBACK_ENDPOINT = '/digital_output/input'
+ENDPOINTS = {'ao': AO_ENDPOINT, 'do': DO_ENDPOINT}
+
+'''Output State Function'''
+def output_state(ao=None, do=None):
+    '''Whole output state of a node, None leaves that output group untouched'''
+    return {'ao': list(ao) if ao is not None else None, 'do': list(do) if do is not None else None}
+
+'''Apply Output State Function'''
+async def apply_state(node_ip, state, verify=True, timeout=5, client=None):
+    '''Write AO and DO of one node concurrently, then read the digital outputs back, return an acknowledgement'''
+    client = client or remoteDAQ_Client.get_client()
+    writes = {}
+    if state.get('ao') is not None:
+        writes['ao'] = client.api_request(node_url(node_ip, ENDPOINTS['ao']), payload={'value': state['ao']})
+    if state.get('do') is not None:
+        writes['do'] = client.api_request(node_url(node_ip, ENDPOINTS['do']), payload={'value': state['do']})
+    ack = {'success': True, 'verified': None, 'data': []}
+    try:
+        results = await asyncio.wait_for(asyncio.gather(*writes.values()), timeout)
+    except asyncio.TimeoutError:
+        my_logger.error('### Node Write Timed Out ###', extra={'node': node_ip, 'endpoint': ', '.join(ENDPOINTS[group] for group in writes), 'latency': timeout})
+        return {'success': False, 'verified': False, 'data': ['Timeout after {} s'.format(timeout)]}
+    for group, result in zip(writes, results):
+        ack[group] = result
+        if result['success'] != True:
+            ack['success'] = False
+            ack['data'].append('{}: {}'.format(group.upper(), result['data'][0]))
+    if verify and ack['success'] and state.get('do') is not None:
+        try:
+            readback = await asyncio.wait_for(client.api_request(node_url(node_ip, READBACK_ENDPOINT), max_age=0), timeout)
+        except asyncio.TimeoutError:
+            readback = {'success': False, 'data': ['Timeout after {} s'.format(timeout)]}
+        if readback['success'] == True:
+            actual = [int(r['value']) for r in readback['data']]
+            ack['verified'] = actual[:len(state['do'])] == [int(v) for v in state['do']]
+            if not ack['verified']:
+                ack['success'] = False
+                ack['data'].append('DO read-back mismatch: expected {}, got {}'.format(state['do'], actual))
+        else:
+            ack['verified'] = False
+            ack['success'] = False
+            ack['data'].append('DO read-back failed: {}'.format(readback['data'][0]))
+    if ack['success']:
+        ack['data'] = ['OK']
+    return ack
+
+'''Fan-Out Output Set Function'''
+async def set_outputs(nodes, states, verify=True, concurrency=16, timeout=5, client=None):
+    '''Apply one shared state or {node name: state} to many nodes concurrently, return {node name: acknowledgement}'''
+    client = client or remoteDAQ_Client.get_client()
+    semaphore = asyncio.Semaphore(concurrency)
+    shared = 'ao' in states or 'do' in states
+
+    async def apply(name, node_ip):
+        async with semaphore:
+            return name, await apply_state(node_ip, states if shared else states[name], verify=verify, timeout=timeout, client=client)
+
+    results = await asyncio.gather(*[apply(name, node_ip) for name, node_ip in nodes.items() if shared or name in states])
+    return dict(results)
+
+'''Synchronous Output Set Function'''
+def set_all(nodes, states, verify=True, concurrency=16, timeout=5, client=None):
+    client = client or remoteDAQ_Client.get_client()
+    return client.run(set_outputs(nodes, states, verify=verify, concurrency=concurrency, timeout=timeout, client=client))
@@ -0,0 +1,317 @@
+import csv
+import io
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from os import getenv
+import remoteDAQ_Client
+import remoteDAQ_Metrics
+import remoteDAQ_SSH
+import remoteDAQ_State
+
+'''Logger Config'''
+my_logger = logging.getLogger('RemoteDAQ_Server')
+
+'''Job States'''
+STATES = ['queued', 'authorized', 'ip_assigned', 'copied', 'playbook_running', 'done', 'failed']
+FINISHED = ('done', 'failed')
+CSV_FIELDS = ['node_id', 'name', 'ssh_user', 'ssh_pass', 'root_pass']
+
+'''Parse Provisioning CSV Function'''
+def parse_csv(text):
+    '''Read node_id,name,ssh_user,ssh_pass,root_pass rows, the header line is optional'''
+    entries = []
+    for row in csv.reader(io.StringIO(text)):
+        row = [r.strip() for r in row]
+        if not row or not row[0] or row[0] == 'node_id':
+            continue
+        if len(row) != len(CSV_FIELDS):
+            raise ValueError('Expected {} columns, got {}: {}'.format(len(CSV_FIELDS), len(row), row[0]))
+        entries.append(dict(zip(CSV_FIELDS, row)))
+    return entries
+
+'''Provisioning Queue Class'''
+class provision_queue:
+    '''Runs node provisioning concurrently on a worker pool and persists per-node job state to disk or the shared state'''
+    def __init__(self, zt_net_id, zt_token, ssh, path='data/provision_jobs.json', workers=4, client=None, api_url='https://api.zerotier.com/api/v1',
+                 state=None, owner=None, sync_interval=2.0):
+        self.zt_net_id = str(zt_net_id)
+        self.api_url = api_url
+        self.zt_token = str(zt_token)
+        self.ssh = ssh
+        self.path = path
+        self.client = client or remoteDAQ_Client.get_client()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='RemoteDAQ_Provision')
+        self.jobs = {}
+        self.listeners = {}
+        self.output_listeners = {}
+        self.tails = {}
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.state = state if state is not None and state.shared else None
+        self.owner = owner
+        self.sync_interval = sync_interval
+        self.stop_event = threading.Event()
+        self.syncer = None
+        self.load()
+
+    '''Load Job State Function'''
+    def load(self):
+        if self.state:
+            self.load_shared()
+            return
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                self.jobs = json.load(f)
+        except Exception as e:
+            my_logger.error('### Failed to Load Provisioning Jobs ###')
+            my_logger.error(e)
+            return
+        for job in self.jobs.values():
+            if job['state'] not in FINISHED:
+                job['state'] = 'failed'
+                job['message'] = 'Interrupted by server restart'
+
+    '''Load Shared Job State Function'''
+    def load_shared(self):
+        try:
+            self.jobs = self.state.items('provision')
+            self.fail_orphans(self.jobs)
+        except Exception as e:
+            my_logger.error('### Failed to Load Provisioning Jobs ###')
+            my_logger.error(e)
+
+    '''Fail Orphaned Jobs Function'''
+    def fail_orphans(self, jobs):
+        '''Mark failed the unfinished jobs whose worker stopped heartbeating, checked on load and on every sync since a restarted worker's old heartbeat outlives it by up to LEADER_TTL'''
+        alive = self.state.items('workers')
+        for job in jobs.values():
+            if job['state'] not in FINISHED and job.get('worker') != self.owner and job.get('worker') not in alive:
+                job['state'] = 'failed'
+                job['message'] = 'Interrupted by server restart'
+                job['updated'] = time.time()
+                self.state.set('provision', job['node_id'], job)
+                my_logger.warning('### Provisioning Job Orphaned by Stopped Worker ###', extra={'node': job['node_id']})
+
+    '''Save Job State Function'''
+    def save(self, job=None):
+        if self.state:
+            if job:
+                self.state.set('provision', job['node_id'], job)
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.save_lock:
+            with self.lock:
+                data = json.dumps(self.jobs)
+            with open(self.path + '.tmp', 'w') as f:
+                f.write(data)
+            os.replace(self.path + '.tmp', self.path)
+
+    '''Update Job Function'''
+    def update(self, node_id, **fields):
+        with self.lock:
+            job = self.jobs[node_id]
+            job.update(fields)
+            job['updated'] = time.time()
+            job = dict(job)
+        self.save(job)
+        self.notify(job)
+
+    '''Notify Sessions Function'''
+    def notify(self, job):
+        with self.lock:
+            listeners = list(self.listeners.items())
+        for session_id, callback in listeners:
+            try:
+                callback(job)
+            except Exception as e:
+                my_logger.error('### Unexpected Provisioning Callback Error Occured, Dropping Session ###')
+                my_logger.error(e)
+                self.unsubscribe(session_id)
+
+    '''Submit Jobs Function'''
+    def submit(self, entries):
+        '''Queue provisioning entries, a node that is still running is skipped, return queued node IDs'''
+        queued = []
+        for entry in entries:
+            node_id = entry['node_id']
+            if self.state:
+                current = self.state.get('provision', node_id)
+                if current and current['state'] not in FINISHED:
+                    continue
+            with self.lock:
+                if node_id in self.jobs and self.jobs[node_id]['state'] not in FINISHED:
+                    continue
+                self.jobs[node_id] = {'node_id': node_id, 'name': entry['name'], 'ip': '', 'state': 'queued', 'message': '', 'worker': self.owner}
+                self.tails.pop(node_id, None)
+            self.update(node_id)
+            self.executor.submit(self.run, entry)
+            queued.append(node_id)
+        return queued
+
+    '''Run Provisioning Job Function'''
+    def run(self, entry):
+        node_id = entry['node_id']
+        try:
+            zt_url = self.api_url + '/network/' + self.zt_net_id + '/member/' + node_id
+            headers = {'Authorization' : 'Bearer ' + self.zt_token}
+            auth_result = self.client.request(zt_url, payload={'name': entry['name'], 'config': {'authorized': True}}, headers=headers)
+            if not auth_result.get('config', {}).get('authorized'):
+                return self.update(node_id, state='failed', message='ZeroTier authorization failed')
+            self.update(node_id, state='authorized')
+
+            node_ip = ''
+            for _ in range(10):
+                ip_result = self.client.request(zt_url, headers=headers)
+                if ip_result.get('config', {}).get('ipAssignments'):
+                    node_ip = ip_result['config']['ipAssignments'][0]
+                    break
+                time.sleep(3)
+            if not node_ip:
+                return self.update(node_id, state='failed', message='No IP address assigned')
+            self.update(node_id, state='ip_assigned', ip=node_ip)
+
+            if self.ssh(host=node_ip, username=entry['ssh_user'], password=entry['ssh_pass'], file='.env-node') != 'OK':
+                return self.update(node_id, state='failed', message='Failed to copy .env-node')
+            self.update(node_id, state='copied')
+
+            self.update(node_id, state='playbook_running')
+            playbook = f'cd /home/{entry["ssh_user"]}/RemoteDAQ; ansible-playbook remotedaq_node_setup.yml -i inventory'
+            listing = []
+            self.ssh(host=node_ip, username='root', password=entry['root_pass'], command=f'bash -c "{playbook} --list-tasks"', on_line=listing.append)
+            progress = remoteDAQ_SSH.playbook_progress(remoteDAQ_SSH.count_tasks(listing))
+
+            def on_line(line):
+                self.emit(node_id, line)
+                if progress.feed(line):
+                    self.update(node_id, message=progress.summary())
+
+            ssh_result = self.ssh(host=node_ip,
+                        username='root',
+                        password=entry['root_pass'],
+                        command=f'bash -c "{playbook}"',
+                        on_line=on_line
+                        )
+            if ssh_result == 'OK':
+                self.update(node_id, state='done', message='OK')
+            else:
+                self.update(node_id, state='failed', message='Playbook failed')
+        except Exception as e:
+            my_logger.error('### Unexpected Provisioning Error Occured ###')
+            my_logger.error(e)
+            self.update(node_id, state='failed', message=str(e))
+
+    '''Emit Output Line Function'''
+    def emit(self, node_id, line):
+        with self.lock:
+            if node_id not in self.tails:
+                self.tails[node_id] = deque(maxlen=200)
+            self.tails[node_id].append(line)
+            listeners = list(self.output_listeners.items())
+        for session_id, callback in listeners:
+            try:
+                callback(node_id, line)
+            except Exception as e:
+                my_logger.error('### Unexpected Provisioning Output Callback Error Occured, Dropping Session ###')
+                my_logger.error(e)
+                self.unsubscribe(session_id)
+
+    '''Subscribe Output Function'''
+    def subscribe_output(self, session_id, callback):
+        '''Register callback(node_id, line) for streamed playbook output'''
+        with self.lock:
+            self.output_listeners[session_id] = callback
+
+    '''Output Tail Function'''
+    def tail(self, node_id):
+        with self.lock:
+            return list(self.tails.get(node_id, []))
+
+    '''Subscribe Session Function'''
+    def subscribe(self, session_id, callback):
+        '''Register callback(job) and return a snapshot of every job'''
+        with self.lock:
+            self.listeners[session_id] = callback
+            return [dict(job) for job in self.jobs.values()]
+
+    '''Unsubscribe Session Function'''
+    def unsubscribe(self, session_id):
+        with self.lock:
+            self.listeners.pop(session_id, None)
+            self.output_listeners.pop(session_id, None)
+
+    '''Sync Shared Jobs Function'''
+    def sync(self):
+        '''Pick up jobs other workers added or advanced and pass them to this worker's sessions'''
+        changed = []
+        jobs = self.state.items('provision')
+        self.fail_orphans(jobs)
+        with self.lock:
+            for node_id, job in jobs.items():
+                local = self.jobs.get(node_id)
+                if local is None or job.get('updated', 0) > local.get('updated', 0):
+                    self.jobs[node_id] = job
+                    changed.append(dict(job))
+        for job in changed:
+            self.notify(job)
+
+    '''Sync Loop Function'''
+    def sync_loop(self):
+        while not self.stop_event.wait(self.sync_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                my_logger.error('### Unexpected Provisioning Sync Error Occured ###')
+                my_logger.error(e)
+
+    '''Start Sync Function'''
+    def start(self):
+        if self.state and self.syncer is None:
+            self.syncer = threading.Thread(target=self.sync_loop, name='RemoteDAQ_Provision_Sync', daemon=True)
+            self.syncer.start()
+
+    '''Stop Sync Function'''
+    def stop(self):
+        self.stop_event.set()
+
+    '''Queue Stats Function'''
+    def stats(self):
+        with self.lock:
+            states = [job['state'] for job in self.jobs.values()]
+        return {state: states.count(state) for state in STATES}
+
+    '''Metrics Collector Function'''
+    def collect(self):
+        return [('remotedaq_provision_jobs', 'Provisioning jobs by state', {'state': state}, count) for state, count in self.stats().items()] + [
+            ('remotedaq_queue_depth', 'Work waiting in server queues', {'queue': 'provisioning'}, self.executor._work_queue.qsize()),
+        ]
+
+'''Shared Queue Instance'''
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_queue(ssh) -> provision_queue:
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = provision_queue(
+                getenv('ZT_NET_ID'),
+                getenv('ZT_TOKEN'),
+                ssh,
+                path=getenv('PROVISION_STATE', 'data/provision_jobs.json'),
+                workers=int(getenv('PROVISION_WORKERS', 4)),
+                api_url=getenv('ZT_API_URL', 'https://api.zerotier.com/api/v1'),
+                state=remoteDAQ_State.get_state(),
+                owner=remoteDAQ_State.get_leader().owner,
+            )
+            _queue.start()
+            remoteDAQ_Metrics.get_registry().collector(_queue.collect)
+        return _queue
@@ -0,0 +1,299 @@
+import atexit
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from os import getenv
+import paramiko
+import scp
+import remoteDAQ_Metrics
+
+'''Logger Config'''
+my_logger = logging.getLogger('RemoteDAQ_Server')
+
+'''SSH Connection Pool Class'''
+class ssh_pool:
+    '''Keeps one authenticated SSH transport per (host, port, user) alive for reuse, evicting idle and least recently used ones that no call is using'''
+    def __init__(self, max_size=16, idle_timeout=300, keepalive=30, connect_timeout=3):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self.connections = OrderedDict()
+        self.connecting = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        metrics = remoteDAQ_Metrics.get_registry()
+        self.connect_seconds = metrics.histogram('remotedaq_ssh_connect_seconds', 'SSH connect and authentication duration')
+        self.command_seconds = metrics.histogram('remotedaq_ssh_command_seconds', 'SSH command and file copy duration', ['kind'])
+        self.reaper = threading.Thread(target=self.reap, name='RemoteDAQ_SSH_Reaper', daemon=True)
+        self.reaper.start()
+
+    '''Open Connection Function'''
+    def connect(self, host, username, password, port):
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        with self.connect_seconds.labels().time():
+            ssh.connect(host, port, username, password, timeout=self.connect_timeout)
+        ssh.get_transport().set_keepalive(self.keepalive)
+        return ssh
+
+    '''Usable Entry Function'''
+    @staticmethod
+    def usable(entry, password):
+        transport = entry['client'].get_transport()
+        return entry['password'] == password and transport and transport.is_active()
+
+    '''Check Out Connection Function'''
+    def acquire(self, host, username, password, port=22):
+        '''Return a pool entry marked in use, concurrent misses on one key wait for a single connect'''
+        key = (host, port, username)
+        with self.lock:
+            key_lock = self.connecting.setdefault(key, threading.Lock())
+        with key_lock:
+            with self.lock:
+                entry = self.connections.get(key)
+                if entry and self.usable(entry, password):
+                    self.connections.move_to_end(key)
+                    entry['users'] += 1
+                    self.hits += 1
+                    return entry
+                self.misses += 1
+            if entry:
+                self.discard(key)
+            ssh = self.connect(host, username, password, port)
+            entry = {'key': key, 'client': ssh, 'password': password, 'last_used': time.monotonic(), 'users': 1, 'retired': False}
+            with self.lock:
+                self.connections[key] = entry
+                evict = self.evict()
+            for old in evict:
+                old['client'].close()
+            return entry
+
+    '''Release Connection Function'''
+    def release(self, entry):
+        with self.lock:
+            entry['users'] -= 1
+            entry['last_used'] = time.monotonic()
+            close = entry['retired'] and not entry['users']
+            evict = self.evict()
+        if close:
+            entry['client'].close()
+        for old in evict:
+            old['client'].close()
+
+    '''Pooled Connection Function'''
+    @contextmanager
+    def connection(self, host, username, password, port=22):
+        '''Hold a pooled client for the whole call, the reaper and eviction never close it meanwhile'''
+        entry = self.acquire(host, username, password, port)
+        try:
+            yield entry['client']
+        finally:
+            self.release(entry)
+
+    '''Evict Connections Function'''
+    def evict(self):
+        '''Pop least recently used idle entries over max_size, called with the lock held, busy ones may keep the pool over size'''
+        evict = []
+        for key in list(self.connections):
+            if len(self.connections) <= self.max_size:
+                break
+            if not self.connections[key]['users']:
+                evict.append(self.connections.pop(key))
+                self.evictions += 1
+        return evict
+
+    '''Discard Connection Function'''
+    def discard(self, key):
+        '''Drop a connection from the pool, one still in use is closed by its last user'''
+        with self.lock:
+            entry = self.connections.pop(key, None)
+            if entry:
+                entry['retired'] = True
+            close = entry and not entry['users']
+        if close:
+            entry['client'].close()
+
+    '''Run Commands Function'''
+    def run(self, host, username, password, commands, port=22):
+        '''Run several commands over one pooled transport, return [(exit status, stdout, stderr)]'''
+        results = []
+        with self.connection(host, username, password, port) as ssh:
+            for command in commands:
+                with self.command_seconds.labels('run').time():
+                    stdin, stdout, stderr = ssh.exec_command(command)
+                    out = stdout.read().decode('utf-8')
+                    err = stderr.read().decode('utf-8')
+                    results.append((stdout.channel.recv_exit_status(), out, err))
+        return results
+
+    '''Stream Command Function'''
+    def stream(self, host, username, password, command, on_line, port=22, max_line=4096):
+        '''Run a command with stdout and stderr merged, pass each output line to on_line, return the exit status'''
+        with self.connection(host, username, password, port) as ssh:
+            start = time.perf_counter()
+            channel = ssh.get_transport().open_session()
+            channel.set_combine_stderr(True)
+            channel.exec_command(command)
+            buffer = b''
+            while True:
+                data = channel.recv(4096)
+                if not data:
+                    break
+                lines = (buffer + data).split(b'\n')
+                buffer = lines.pop()
+                if len(buffer) > max_line:
+                    lines.append(buffer[:max_line])
+                    buffer = b''
+                for line in lines:
+                    on_line(line[:max_line].decode('utf-8', 'replace').rstrip('\r'))
+            if buffer:
+                on_line(buffer.decode('utf-8', 'replace').rstrip('\r'))
+            status = channel.recv_exit_status()
+        self.command_seconds.labels('stream').observe(time.perf_counter() - start)
+        return status
+
+    '''Copy File Function'''
+    def put(self, host, username, password, file, remote_path, port=22):
+        with self.connection(host, username, password, port) as ssh:
+            with self.command_seconds.labels('put').time():
+                with scp.SCPClient(ssh.get_transport()) as scp_client:
+                    scp_client.put(file, remote_path)
+
+    '''Idle Reaper Thread Function'''
+    def reap(self):
+        while not self.stop_event.wait(max(self.idle_timeout / 2, 1)):
+            now = time.monotonic()
+            with self.lock:
+                idle = [key for key, entry in self.connections.items() if not entry['users'] and now - entry['last_used'] > self.idle_timeout]
+            for key in idle:
+                self.discard(key)
+                self.evictions += 1
+
+    '''Close All Connections Function'''
+    def close_all(self):
+        self.stop_event.set()
+        with self.lock:
+            entries = list(self.connections.values())
+            self.connections.clear()
+        for entry in entries:
+            entry['client'].close()
+
+    '''Pool Stats Function'''
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self.connections),
+            'in_use': sum(1 for entry in list(self.connections.values()) if entry['users']),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+        }
+
+    '''Metrics Collector Function'''
+    def collect(self):
+        stats = self.stats()
+        return [
+            ('remotedaq_ssh_pool_connections', 'Pooled SSH transports', {}, stats['size']),
+            ('remotedaq_ssh_pool_hits', 'SSH calls served by a pooled transport', {}, stats['hits']),
+            ('remotedaq_ssh_pool_misses', 'SSH calls that opened a new transport', {}, stats['misses']),
+        ]
+
+'''Ansible Playbook Progress Class'''
+class playbook_progress:
+    '''Tracks the running task from streamed ansible-playbook output'''
+    TASK = re.compile(r'^TASK \[(.*)\]')
+    FAILED = re.compile(r'^(fatal|failed): ')
+
+    def __init__(self, total=None):
+        self.total = total
+        self.done = 0
+        self.task = ''
+        self.failed = 0
+        self.recap = False
+
+    '''Feed Output Line Function'''
+    def feed(self, line):
+        '''Return True when the line changed the progress'''
+        match = self.TASK.match(line)
+        if match:
+            if self.task:
+                self.done += 1
+            self.task = match.group(1)
+            return True
+        if line.startswith('PLAY RECAP'):
+            if self.task:
+                self.done += 1
+            self.task = ''
+            self.recap = True
+            return True
+        if self.FAILED.match(line):
+            self.failed += 1
+            return True
+        return False
+
+    '''Progress Summary Function'''
+    def summary(self):
+        total = '/' + str(self.total) if self.total else ''
+        failed = ' ({} failed)'.format(self.failed) if self.failed else ''
+        if self.recap:
+            return 'Recap: {} task(s) run{}'.format(self.done, failed)
+        return 'Task {}{}: {}{}'.format(self.done + 1, total, self.task, failed)
+
+'''Count Listed Tasks Function'''
+def count_tasks(lines):
+    '''Count tasks in ansible-playbook --list-tasks output'''
+    return len([l for l in lines if 'TAGS:' in l and not l.strip().startswith('play #')])
+
+'''Shared Pool Instance'''
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ssh_pool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ssh_pool(
+                max_size=int(getenv('SSH_POOL_SIZE', 16)),
+                idle_timeout=float(getenv('SSH_IDLE_TIMEOUT', 300)),
+                keepalive=int(getenv('SSH_KEEPALIVE', 30)),
+            )
+            atexit.register(_pool.close_all)
+            remoteDAQ_Metrics.get_registry().collector(_pool.collect)
+        return _pool
+
+'''SSH Function'''
+def ssh_client(host, username, password, command='', file='', port=22, on_line=None):
+    pool = get_pool()
+    if file:
+        try:
+            pool.put(host, username, password, file, 'RemoteDAQ/' + file, port=port)
+        except Exception as e:
+            my_logger.error('### Unexpected SCP Error Occured ###')
+            my_logger.error(e)
+            pool.discard((host, port, username))
+            return 'ERR'
+        return 'OK'
+    elif command:
+        def log_line(line):
+            my_logger.info('[{}] {}'.format(host, line))
+            if on_line:
+                on_line(line)
+        try:
+            status = pool.stream(host, username, password, command, log_line, port=port)
+        except Exception as e:
+            my_logger.error('### Unexpected SSH Error Occured ###')
+            my_logger.error(e)
+            pool.discard((host, port, username))
+            return 'ERR'
+        if status != 0:
+            my_logger.error('### SSH Command Exited With Status {} ###'.format(status))
+            return 'ERR'
+        return 'OK'
@@ -0,0 +1,133 @@
+import logging
+import threading
+import time
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES
+import remoteDAQ_Metrics
+
+'''Logger Config'''
+my_logger = logging.getLogger('RemoteDAQ_Server')
+
+'''Session Scheduler Class'''
+class session_scheduler:
+    '''One BackgroundScheduler for the process, sessions subscribe callbacks to its named interval jobs'''
+    def __init__(self, stats_interval=300):
+        self.sched = BackgroundScheduler()
+        self.sched.add_listener(self.job_overrun, EVENT_JOB_MAX_INSTANCES)
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.stats_interval = stats_interval
+        metrics = remoteDAQ_Metrics.get_registry()
+        self.durations = metrics.histogram('remotedaq_scheduler_job_seconds', 'Scheduler job run duration across all subscribed sessions', ['job'])
+        self.overruns = metrics.counter('remotedaq_scheduler_job_overruns_total', 'Scheduler job runs skipped because the previous run was still going', ['job'])
+
+    '''Add Interval Job Function'''
+    def add_job(self, name, seconds):
+        with self.lock:
+            if name in self.jobs:
+                return
+            self.jobs[name] = {
+                'interval': seconds,
+                'subscribers': {},
+                'runs': 0,
+                'overruns': 0,
+                'last_duration': 0.0,
+                'total_duration': 0.0,
+                'max_duration': 0.0,
+            }
+        self.sched.add_job(self.run_job, 'interval', seconds=seconds, args=[name], id=name, max_instances=1, coalesce=True)
+
+    '''Subscribe Session Function'''
+    def subscribe(self, session_id, name, callback):
+        with self.lock:
+            self.jobs[name]['subscribers'][session_id] = callback
+
+    '''Unsubscribe Session Function'''
+    def unsubscribe(self, session_id):
+        with self.lock:
+            for job in self.jobs.values():
+                job['subscribers'].pop(session_id, None)
+
+    '''Run Job Function'''
+    def run_job(self, name):
+        job = self.jobs[name]
+        with self.lock:
+            subscribers = list(job['subscribers'].items())
+        start = time.perf_counter()
+        for session_id, callback in subscribers:
+            try:
+                callback()
+            except Exception as e:
+                my_logger.error('### Unexpected Scheduler Job Error Occured, Dropping Session ###')
+                my_logger.error(e)
+                with self.lock:
+                    job['subscribers'].pop(session_id, None)
+        duration = time.perf_counter() - start
+        self.durations.labels(name).observe(duration)
+        with self.lock:
+            job['runs'] += 1
+            job['last_duration'] = duration
+            job['total_duration'] += duration
+            job['max_duration'] = max(job['max_duration'], duration)
+
+    '''Job Overrun Listener Function'''
+    def job_overrun(self, event):
+        with self.lock:
+            if event.job_id in self.jobs:
+                self.jobs[event.job_id]['overruns'] += 1
+                self.overruns.labels(event.job_id).inc()
+
+    '''Scheduler Stats Function'''
+    def stats(self):
+        with self.lock:
+            return {
+                'threads': threading.active_count(),
+                'jobs': {
+                    name: {
+                        'interval': job['interval'],
+                        'subscriptions': len(job['subscribers']),
+                        'runs': job['runs'],
+                        'overruns': job['overruns'],
+                        'last_duration': job['last_duration'],
+                        'avg_duration': job['total_duration'] / job['runs'] if job['runs'] else 0.0,
+                        'max_duration': job['max_duration'],
+                    } for name, job in self.jobs.items()
+                },
+            }
+
+    '''Metrics Collector Function'''
+    def collect(self):
+        with self.lock:
+            subscriptions = [(name, len(job['subscribers'])) for name, job in self.jobs.items()]
+        return [('remotedaq_scheduler_subscriptions', 'Sessions subscribed to a scheduler job', {'job': name}, count) for name, count in subscriptions] + [
+            ('remotedaq_threads', 'Live threads in the server process', {}, threading.active_count()),
+        ]
+
+    '''Log Stats Function'''
+    def log_stats(self):
+        my_logger.info('Scheduler stats: {}'.format(self.stats()))
+
+    '''Start Scheduler Function'''
+    def start(self):
+        if not self.sched.running:
+            if self.stats_interval:
+                self.sched.add_job(self.log_stats, 'interval', seconds=self.stats_interval, id='log_stats')
+            self.sched.start()
+
+    '''Shutdown Scheduler Function'''
+    def shutdown(self):
+        if self.sched.running:
+            self.sched.shutdown(wait=False)
+
+'''Shared Scheduler Instance'''
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> session_scheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = session_scheduler()
+            _scheduler.start()
+            remoteDAQ_Metrics.get_registry().collector(_scheduler.collect)
+        return _scheduler
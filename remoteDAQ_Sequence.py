@@ -0,0 +1,271 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import math
+import statistics
+import time
+from bisect import bisect_right
+from collections import deque
+import remoteDAQ_Client
+from remoteDAQ_Acquisition import node_url
+from remoteDAQ_Output import ENDPOINTS
+
+'''Logger Config'''
+my_logger = logging.getLogger('RemoteDAQ_Server')
+
+'''Output Limits'''
+AO_PINS = 2
+DO_PINS = 8
+AO_MIN = 0.0
+AO_MAX = 5.0
+
+'''Waveform Shapes'''
+SHAPES = {
+    'sine': lambda phase: 0.5 - 0.5 * math.cos(2 * math.pi * phase),
+    'ramp': lambda phase: phase,
+    'triangle': lambda phase: 1 - abs(2 * phase - 1),
+    'square': lambda phase: 1.0 if phase < 0.5 else 0.0,
+}
+
+'''Clamp AO Value Function'''
+def clamp(value):
+    return min(max(float(value), AO_MIN), AO_MAX)
+
+'''Output Sequence Class'''
+class sequence:
+    '''Timeline of keyframes (DO steps, AO steps or ramps from the previous value of that pin) plus periodic AO waveforms, sampled with state_at(t)'''
+    def __init__(self, keyframes=(), waveforms=(), duration=None, loop=False):
+        self.times = []
+        self.frames = []
+        self.ramps = [([], [], []) for _ in range(AO_PINS)]
+        self.loop = loop
+        do = [None] * DO_PINS
+        try:
+            self.waveforms = [self.waveform(w) for w in waveforms]
+            for frame in sorted(keyframes, key=lambda f: float(f['t'])):
+                t = float(frame['t'])
+                for pin, v in enumerate(self.pins(frame.get('ao'), AO_PINS)):
+                    if v is not None:
+                        times, values, ramps = self.ramps[pin]
+                        times.append(t)
+                        values.append(clamp(v))
+                        ramps.append(bool(frame.get('ramp')))
+                if any(v is not None for v in self.pins(frame.get('do'), DO_PINS)):
+                    do = [int(bool(v)) if v is not None else do[i] for i, v in enumerate(self.pins(frame.get('do'), DO_PINS))]
+                    self.times.append(t)
+                    self.frames.append(list(do))
+            ends = self.times[-1:] + [times[-1] for times, _, _ in self.ramps if times] + [w['end'] for w in self.waveforms if 'end' in w]
+            self.duration = float(duration) if duration is not None else max(ends, default=0.0)
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError('Malformed timeline ({}: {})'.format(type(e).__name__, e)) from e
+        if self.duration <= 0:
+            raise ValueError('Sequence has no duration')
+
+    '''Check Waveform Function'''
+    @staticmethod
+    def waveform(w):
+        '''Copy of a waveform with its numbers parsed, so state_at never fails during playback'''
+        w = dict(w)
+        if w.get('shape', 'sine') not in SHAPES:
+            raise ValueError('Unknown waveform shape: {}'.format(w.get('shape')))
+        w['pin'] = int(w['pin'])
+        if not 0 <= w['pin'] < AO_PINS:
+            raise ValueError('Waveforms drive AO pins 0 to {}'.format(AO_PINS - 1))
+        for field in ('start', 'end', 'frequency', 'phase', 'low', 'high'):
+            if field in w:
+                w[field] = float(w[field])
+        return w
+
+    '''Pad Pin Values Function'''
+    @staticmethod
+    def pins(values, count):
+        values = list(values or [])[:count]
+        return values + [None] * (count - len(values))
+
+    '''Output State Function'''
+    def state_at(self, t):
+        '''Return {'ao': [...] or None, 'do': [...] or None} at t seconds, a group is None until one of its pins is set'''
+        i = bisect_right(self.times, t) - 1
+        do = list(self.frames[i]) if i >= 0 else [None] * DO_PINS
+        ao = [None] * AO_PINS
+        for pin, (times, values, ramps) in enumerate(self.ramps):
+            i = bisect_right(times, t) - 1
+            if i >= 0:
+                ao[pin] = values[i]
+                if i + 1 < len(times) and ramps[i + 1]:
+                    ao[pin] += (values[i + 1] - values[i]) * (t - times[i]) / (times[i + 1] - times[i])
+        for w in self.waveforms:
+            start = float(w.get('start', 0))
+            if start <= t < float(w.get('end', self.duration)):
+                phase = ((t - start) * float(w.get('frequency', 1)) + float(w.get('phase', 0))) % 1
+                low, high = float(w.get('low', AO_MIN)), float(w.get('high', AO_MAX))
+                ao[int(w['pin'])] = clamp(low + (high - low) * SHAPES[w.get('shape', 'sine')](phase))
+        return {
+            'ao': [round(v, 3) if v is not None else 0.0 for v in ao] if any(v is not None for v in ao) else None,
+            'do': [v or 0 for v in do] if any(v is not None for v in do) else None,
+        }
+
+'''Parse Timeline Function'''
+def parse_timeline(text):
+    '''Build a sequence from JSON {"keyframes", "waveforms", "duration", "loop"} or CSV with a t,ao_0,..,do_7,ramp header'''
+    text = text.strip()
+    if text.startswith('{'):
+        timeline = json.loads(text)
+        return sequence(
+            keyframes=timeline.get('keyframes', []),
+            waveforms=timeline.get('waveforms', []),
+            duration=timeline.get('duration'),
+            loop=bool(timeline.get('loop')),
+        )
+    keyframes = []
+    for row in csv.DictReader(io.StringIO(text)):
+        row = {k.strip(): v.strip() for k, v in row.items() if k and v is not None}
+        if not row.get('t'):
+            continue
+        keyframes.append({
+            't': float(row['t']),
+            'ao': [float(row['ao_' + str(p)]) if row.get('ao_' + str(p)) else None for p in range(AO_PINS)],
+            'do': [int(row['do_' + str(p)]) if row.get('do_' + str(p)) else None for p in range(DO_PINS)],
+            'ramp': row.get('ramp', '').lower() in ('1', 'true', 'yes'),
+        })
+    if not keyframes:
+        raise ValueError('Timeline has no keyframes')
+    return sequence(keyframes=keyframes)
+
+'''Sequence Player Class'''
+class sequence_player:
+    '''Plays a sequence against several nodes on the client loop, ticks are scheduled on absolute times so drift does not accumulate'''
+    def __init__(self, nodes, sequence, rate=10, client=None, on_done=None):
+        self.nodes = dict(nodes)
+        self.sequence = sequence
+        self.rate = rate
+        self.client = client or remoteDAQ_Client.get_client()
+        self.on_done = on_done
+        self.last_sent = {}
+        self.inflight = set()
+        self.pending = {}
+        self.jitter = deque(maxlen=10000)
+        self.latency = deque(maxlen=10000)
+        self.running = False
+        self.task = None
+        self.ticks = 0
+        self.missed_ticks = 0
+        self.writes = 0
+        self.errors = 0
+        self.coalesced = 0
+        self.started_at = 0.0
+        self.finished_at = 0.0
+
+    '''Playback Loop Function'''
+    async def play(self):
+        loop = asyncio.get_running_loop()
+        period = 1 / self.rate
+        start = loop.time()
+        k = 0
+        try:
+            while self.running:
+                t = k * period
+                if t > self.sequence.duration:
+                    if not self.sequence.loop:
+                        break
+                    t %= self.sequence.duration
+                target = start + k * period
+                delay = target - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.jitter.append(loop.time() - target)
+                self.tick(self.sequence.state_at(t))
+                self.ticks += 1
+                k += 1
+                behind = int((loop.time() - start) / period) - k
+                if behind > 0:
+                    self.missed_ticks += behind
+                    k += behind
+            while self.inflight:
+                await asyncio.sleep(period)
+        finally:
+            self.running = False
+            self.finished_at = time.monotonic()
+            if self.on_done:
+                loop.run_in_executor(None, self.done)
+
+    '''Dispatch Tick Function'''
+    def tick(self, state):
+        '''Send every output group whose value changed without waiting for the replies'''
+        for name in self.nodes:
+            for group, value in state.items():
+                key = (name, group)
+                if value is None or self.last_sent.get(key) == value:
+                    continue
+                self.last_sent[key] = value
+                if key in self.inflight:
+                    if key in self.pending:
+                        self.coalesced += 1
+                    self.pending[key] = value
+                    continue
+                self.inflight.add(key)
+                asyncio.ensure_future(self.write(key, value))
+
+    '''Write Output Function'''
+    async def write(self, key, value):
+        '''Keep one request in flight per node and output group, the newest waiting value goes next'''
+        name, group = key
+        try:
+            while value is not None:
+                start = time.perf_counter()
+                result = await self.client.api_request(node_url(self.nodes[name], ENDPOINTS[group]), payload={'value': value})
+                self.latency.append(time.perf_counter() - start)
+                self.writes += 1
+                if result['success'] != True:
+                    self.errors += 1
+                value = self.pending.pop(key, None)
+        finally:
+            self.inflight.discard(key)
+
+    '''Done Callback Function'''
+    def done(self):
+        try:
+            self.on_done(self.stats())
+        except Exception as e:
+            my_logger.error('### Unexpected Sequence Callback Error Occured ###')
+            my_logger.error(e)
+
+    '''Start Playback Function'''
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.started_at = time.monotonic()
+        self.task = self.client.submit(self.play())
+
+    '''Stop Playback Function'''
+    def stop(self):
+        self.running = False
+
+    '''Playback Stats Function'''
+    def stats(self):
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at if self.started_at else 0.0
+        jitter = sorted(abs(j) for j in self.jitter)
+        latency = sorted(self.latency)
+        return {
+            'nodes': len(self.nodes),
+            'target_rate': self.rate,
+            'achieved_rate': self.ticks / elapsed if elapsed else 0.0,
+            'write_rate': self.writes / elapsed if elapsed else 0.0,
+            'ticks': self.ticks,
+            'missed_ticks': self.missed_ticks,
+            'writes': self.writes,
+            'errors': self.errors,
+            'coalesced': self.coalesced,
+            'jitter_ms': {
+                'mean': statistics.fmean(jitter) * 1000 if jitter else 0.0,
+                'p95': jitter[int(len(jitter) * 0.95)] * 1000 if jitter else 0.0,
+                'max': jitter[-1] * 1000 if jitter else 0.0,
+            },
+            'write_latency_ms': {
+                'p50': latency[len(latency) // 2] * 1000 if latency else 0.0,
+                'p95': latency[int(len(latency) * 0.95)] * 1000 if latency else 0.0,
+            },
+        }
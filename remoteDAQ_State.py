@@ -0,0 +1,314 @@
+import atexit
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from os import getenv
+import remoteDAQ_Metrics
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+'''Logger Config'''
+my_logger = logging.getLogger('RemoteDAQ_Server')
+
+'''Worker ID Function'''
+def worker_id():
+    '''Unique per process start, so a restarted worker never inherits the jobs or leases of its previous run'''
+    return '{}-{}-{}'.format(getenv('WORKER_INDEX', '0'), socket.gethostname(), os.getpid())
+
+'''In-Memory State Backend Class'''
+class memory_backend:
+    '''Process-local namespaced key/value state, the default for a single worker'''
+    shared = False
+
+    def __init__(self):
+        self.data = {}
+        self.leases = {}
+        self.lock = threading.Lock()
+
+    '''Get Value Function'''
+    def get(self, namespace, key):
+        with self.lock:
+            entry = self.data.get(namespace, {}).get(key)
+            if entry and (entry[1] is None or entry[1] > time.time()):
+                return json.loads(entry[0])
+        return None
+
+    '''Set Value Function'''
+    def set(self, namespace, key, value, ttl=None):
+        entry = (json.dumps(value), time.time() + ttl if ttl else None)
+        with self.lock:
+            self.data.setdefault(namespace, {})[key] = entry
+
+    '''Delete Value Function'''
+    def delete(self, namespace, key):
+        with self.lock:
+            self.data.get(namespace, {}).pop(key, None)
+
+    '''Namespace Items Function'''
+    def items(self, namespace):
+        now = time.time()
+        with self.lock:
+            entries = list(self.data.get(namespace, {}).items())
+        return {key: json.loads(value) for key, (value, expires) in entries if expires is None or expires > now}
+
+    '''Acquire Lease Function'''
+    def lease(self, name, owner, ttl):
+        '''Take or renew the named lease, return True if owner holds it'''
+        now = time.time()
+        with self.lock:
+            holder = self.leases.get(name)
+            if holder and holder[0] != owner and holder[1] > now:
+                return False
+            self.leases[name] = (owner, now + ttl)
+            return True
+
+    '''Release Lease Function'''
+    def release(self, name, owner):
+        with self.lock:
+            if self.leases.get(name, (None,))[0] == owner:
+                del self.leases[name]
+
+    '''Purge Expired Function'''
+    def purge(self):
+        now = time.time()
+        with self.lock:
+            for entries in self.data.values():
+                for key in [k for k, (v, expires) in entries.items() if expires is not None and expires <= now]:
+                    del entries[key]
+
+'''SQLite State Backend Class'''
+class sqlite_backend:
+    '''Namespaced key/value state in one SQLite file in WAL mode, shared by worker processes on the same host'''
+    shared = True
+
+    def __init__(self, path='data/state.db', timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = self.db()
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('CREATE TABLE IF NOT EXISTS state (namespace TEXT, key TEXT, value TEXT, expires REAL, PRIMARY KEY (namespace, key))')
+        db.execute('CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT, expires REAL)')
+
+    '''Thread Connection Function'''
+    def db(self):
+        '''One connection per thread in autocommit mode'''
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute('PRAGMA synchronous=NORMAL')
+            self.local.db = db
+        return db
+
+    '''Get Value Function'''
+    def get(self, namespace, key):
+        row = self.db().execute(
+            'SELECT value FROM state WHERE namespace=? AND key=? AND (expires IS NULL OR expires>?)',
+            (namespace, key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    '''Set Value Function'''
+    def set(self, namespace, key, value, ttl=None):
+        self.db().execute(
+            'INSERT INTO state VALUES (?,?,?,?) ON CONFLICT(namespace, key) DO UPDATE SET value=excluded.value, expires=excluded.expires',
+            (namespace, key, json.dumps(value), time.time() + ttl if ttl else None),
+        )
+
+    '''Delete Value Function'''
+    def delete(self, namespace, key):
+        self.db().execute('DELETE FROM state WHERE namespace=? AND key=?', (namespace, key))
+
+    '''Namespace Items Function'''
+    def items(self, namespace):
+        rows = self.db().execute(
+            'SELECT key, value FROM state WHERE namespace=? AND (expires IS NULL OR expires>?)',
+            (namespace, time.time()),
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    '''Acquire Lease Function'''
+    def lease(self, name, owner, ttl):
+        '''Take or renew the named lease, return True if owner holds it'''
+        now = time.time()
+        cursor = self.db().execute(
+            'INSERT INTO leases VALUES (?,?,?) ON CONFLICT(name) DO UPDATE SET owner=excluded.owner, expires=excluded.expires '
+            'WHERE leases.owner=excluded.owner OR leases.expires<=?',
+            (name, owner, now + ttl, now),
+        )
+        return cursor.rowcount == 1
+
+    '''Release Lease Function'''
+    def release(self, name, owner):
+        self.db().execute('DELETE FROM leases WHERE name=? AND owner=?', (name, owner))
+
+    '''Purge Expired Function'''
+    def purge(self):
+        self.db().execute('DELETE FROM state WHERE expires IS NOT NULL AND expires<=?', (time.time(),))
+
+'''Redis State Backend Class'''
+class redis_backend:
+    '''Namespaced key/value state on a Redis-compatible server, for workers spread over several hosts'''
+    shared = True
+    RENEW = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+    RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='remotedaq'):
+        if redis is None:
+            raise RuntimeError('STATE_BACKEND=redis needs the redis package, pip install redis')
+        self.db = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.renew = self.db.register_script(self.RENEW)
+        self.unlock = self.db.register_script(self.RELEASE)
+
+    '''Key Name Function'''
+    def key(self, namespace, key=''):
+        return '{}:{}:{}'.format(self.prefix, namespace, key)
+
+    '''Get Value Function'''
+    def get(self, namespace, key):
+        value = self.db.get(self.key(namespace, key))
+        return json.loads(value) if value is not None else None
+
+    '''Set Value Function'''
+    def set(self, namespace, key, value, ttl=None):
+        self.db.set(self.key(namespace, key), json.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    '''Delete Value Function'''
+    def delete(self, namespace, key):
+        self.db.delete(self.key(namespace, key))
+
+    '''Namespace Items Function'''
+    def items(self, namespace):
+        prefix = self.key(namespace)
+        keys = list(self.db.scan_iter(match=prefix + '*', count=500))
+        if not keys:
+            return {}
+        return {k[len(prefix):]: json.loads(v) for k, v in zip(keys, self.db.mget(keys)) if v is not None}
+
+    '''Acquire Lease Function'''
+    def lease(self, name, owner, ttl):
+        '''Take or renew the named lease, return True if owner holds it'''
+        key = self.key('lease', name)
+        if self.db.set(key, owner, nx=True, px=int(ttl * 1000)):
+            return True
+        return bool(self.renew(keys=[key], args=[owner, int(ttl * 1000)]))
+
+    '''Release Lease Function'''
+    def release(self, name, owner):
+        self.unlock(keys=[self.key('lease', name)], args=[owner])
+
+    '''Purge Expired Function'''
+    def purge(self):
+        '''Redis expires keys itself'''
+
+'''Leader Election Class'''
+class leader_election:
+    '''Renews a named lease from a background thread and heartbeats this worker, one worker leads at a time'''
+    def __init__(self, state, name, owner, ttl=10.0, info=None):
+        self.state = state
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+        self.info = info or {}
+        self.is_leader = False
+        self.started = time.time()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.renew()
+
+    '''Renew Lease Function'''
+    def renew(self):
+        try:
+            leader = self.state.lease(self.name, self.owner, self.ttl)
+            self.state.set('workers', self.owner, dict(self.info, leader=leader, started=self.started), ttl=self.ttl)
+            if leader:
+                self.state.purge()
+        except Exception as e:
+            my_logger.error('### Failed to Renew Worker Lease ###')
+            my_logger.error(e)
+            leader = False
+        if leader != self.is_leader:
+            my_logger.info('Worker {} {} {}'.format(self.owner, 'leads' if leader else 'stopped leading', self.name))
+        self.is_leader = leader
+
+    '''Renew Loop Function'''
+    def run(self):
+        while not self.stop_event.wait(self.ttl / 3):
+            self.renew()
+
+    '''Start Election Function'''
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='RemoteDAQ_Leader', daemon=True)
+            self.thread.start()
+
+    '''Stop Election Function'''
+    def stop(self):
+        self.stop_event.set()
+        try:
+            self.state.release(self.name, self.owner)
+            self.state.delete('workers', self.owner)
+        except Exception as e:
+            my_logger.error('### Failed to Release Worker Lease ###')
+            my_logger.error(e)
+
+    '''Live Workers Function'''
+    def workers(self):
+        return self.state.items('workers')
+
+    '''Metrics Collector Function'''
+    def collect(self):
+        return [
+            ('remotedaq_worker_leader', 'This worker holds the lease (1) or not (0)', {'lease': self.name}, int(self.is_leader)),
+            ('remotedaq_workers_alive', 'Workers heartbeating into the shared state', {}, len(self.workers())),
+            ('remotedaq_acquisitions_active', 'Continuous acquisitions running on every worker', {}, len(self.state.items('acquisitions'))),
+        ]
+
+'''Shared State Instance'''
+_state = None
+_state_lock = threading.Lock()
+
+def get_state():
+    global _state
+    with _state_lock:
+        if _state is None:
+            backend = getenv('STATE_BACKEND', 'memory')
+            if backend == 'sqlite':
+                _state = sqlite_backend(getenv('STATE_PATH', 'data/state.db'))
+            elif backend == 'redis':
+                _state = redis_backend(getenv('STATE_URL', 'redis://localhost:6379/0'))
+            else:
+                _state = memory_backend()
+            my_logger.info('Shared state backend: ' + backend)
+        return _state
+
+'''Shared Leader Instance'''
+_leader = None
+_leader_lock = threading.Lock()
+
+def get_leader() -> leader_election:
+    global _leader
+    with _leader_lock:
+        if _leader is None:
+            _leader = leader_election(
+                get_state(),
+                'poller',
+                worker_id(),
+                ttl=float(getenv('LEADER_TTL', 10)),
+                info={'pid': os.getpid(), 'host': socket.gethostname(), 'port': int(getenv('UI_PORT', 2023))},
+            )
+            _leader.start()
+            atexit.register(_leader.stop)
+            remoteDAQ_Metrics.get_registry().collector(_leader.collect)
+        return _leader
@@ -0,0 +1,287 @@
+import atexit
+import hashlib
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from os import getenv
+from remoteDAQ_Ingest import MEASUREMENTS
+import remoteDAQ_Metrics
+
+'''Logger Config'''
+my_logger = logging.getLogger('RemoteDAQ_Server')
+
+'''Ring File Layout'''
+MAGIC = b'RDAQRING'
+HEADER = struct.Struct('<8sIIQQQ')
+HEADER_SIZE = 64
+RECORD_SIZE = 16
+NODE_FILE = 'node'
+
+'''Ring Segment Class'''
+class ring_segment:
+    '''Fixed-size memory-mapped ring of (int64 ns timestamp, float64 value) records with a persisted replay cursor'''
+    def __init__(self, path, capacity):
+        exists = os.path.exists(path)
+        size = HEADER_SIZE + capacity * RECORD_SIZE
+        with open(path, 'a+b') as f:
+            if not exists or os.path.getsize(path) < HEADER_SIZE:
+                f.truncate(size)
+        self.file = open(path, 'r+b')
+        header = self.file.read(HEADER.size)
+        magic, version, _, stored_capacity, written, replayed = HEADER.unpack(header)
+        if magic == MAGIC:
+            capacity = stored_capacity
+        else:
+            self.file.truncate(size)
+            written = replayed = 0
+        self.capacity = capacity
+        self.mm = mmap.mmap(self.file.fileno(), HEADER_SIZE + capacity * RECORD_SIZE)
+        self.data = memoryview(self.mm)[HEADER_SIZE:]
+        self.timestamps = self.data.cast('q')
+        self.values = self.data.cast('d')
+        self.written = written
+        self.replayed = replayed
+        self.lock = threading.Lock()
+        self.write_header()
+
+    '''Write Header Function'''
+    def write_header(self):
+        self.mm[:HEADER.size] = HEADER.pack(MAGIC, 1, 0, self.capacity, self.written, self.replayed)
+
+    '''Append Sample Function'''
+    def append(self, timestamp, value):
+        with self.lock:
+            i = (self.written % self.capacity) * 2
+            self.timestamps[i] = timestamp
+            self.values[i + 1] = value
+            self.written += 1
+            self.write_header()
+
+    '''Read Chunks Function'''
+    def chunks(self, start, end):
+        '''Return zero-copy memoryviews over the raw records with sequence numbers in [start, end)'''
+        start = max(start, end - self.capacity, 0)
+        if start >= end:
+            return []
+        first, last = start % self.capacity, end % self.capacity or self.capacity
+        if first < last:
+            return [self.data[first * RECORD_SIZE:last * RECORD_SIZE]]
+        return [self.data[first * RECORD_SIZE:], self.data[:last * RECORD_SIZE]]
+
+    '''Pending Replay Function'''
+    def pending(self, limit):
+        '''Return (chunks, next cursor, lost records) for up to limit records not replayed yet'''
+        with self.lock:
+            start = max(self.replayed, self.written - self.capacity)
+            end = min(self.written, start + limit)
+            return self.chunks(start, end), end, start - self.replayed
+
+    '''Advance Replay Cursor Function'''
+    def advance(self, cursor):
+        with self.lock:
+            self.replayed = cursor
+            self.write_header()
+
+    '''Close Segment Function'''
+    def close(self):
+        self.mm.flush()
+        try:
+            self.timestamps.release()
+            self.values.release()
+            self.data.release()
+            self.mm.close()
+        except BufferError:
+            pass
+        self.file.close()
+
+'''Sample Store Class'''
+class sample_store:
+    '''Keeps every acquired sample in ring segments per node and channel, then replays them into the database'''
+    def __init__(self, root='data/samples', capacity=1 << 20, writer=None, replay_interval=1.0, replay_batch=50000):
+        self.root = root
+        self.capacity = capacity
+        self.writer = writer
+        self.replay_interval = replay_interval
+        self.replay_batch = replay_batch
+        self.segments = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.replayer = None
+        self.points_replayed = 0
+        self.points_lost = 0
+        self.load()
+
+    '''Node Directory Function'''
+    def directory(self, node):
+        '''Filesystem-safe directory of a node, names changed by sanitizing get a hash suffix so they never collide'''
+        safe = re.sub(r'[^A-Za-z0-9_.-]', '_', node)
+        if safe != node:
+            safe += '-' + hashlib.sha1(node.encode('utf-8')).hexdigest()[:8]
+        return os.path.join(self.root, safe)
+
+    '''Segment Path Function'''
+    def path(self, node, endpoint, pin):
+        return os.path.join(self.directory(node), MEASUREMENTS[endpoint] + '_' + str(pin) + '.ring')
+
+    '''Load Existing Segments Function'''
+    def load(self):
+        '''Node names come from the index file of each directory, older stores without one use the directory name'''
+        if not os.path.isdir(self.root):
+            return
+        endpoints = {measurement: endpoint for endpoint, measurement in MEASUREMENTS.items()}
+        for directory in os.listdir(self.root):
+            node = directory
+            try:
+                with open(os.path.join(self.root, directory, NODE_FILE), encoding='utf-8') as f:
+                    node = f.read()
+            except FileNotFoundError:
+                pass
+            if os.path.basename(self.directory(node)) != directory:
+                my_logger.warning('### Skipping Unknown Sample Store Directory ###', extra={'node': directory})
+                continue
+            for name in os.listdir(os.path.join(self.root, directory)):
+                match = re.match(r'(.+)_(\d+)\.ring$', name)
+                if match and match.group(1) in endpoints:
+                    self.segment(node, endpoints[match.group(1)], int(match.group(2)))
+
+    '''Get Segment Function'''
+    def segment(self, node, endpoint, pin):
+        '''Segments are keyed by the original node name, which replay sends as the node tag'''
+        key = (node, endpoint, pin)
+        with self.lock:
+            if key not in self.segments:
+                path = self.path(node, endpoint, pin)
+                index = os.path.join(os.path.dirname(path), NODE_FILE)
+                if not os.path.exists(index):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(index, 'w', encoding='utf-8') as f:
+                        f.write(node)
+                self.segments[key] = ring_segment(path, self.capacity)
+            return self.segments[key]
+
+    '''Add Readings Function'''
+    def add(self, node, endpoint, api_response, timestamp=None):
+        '''Append every pin of an input endpoint response, return the number of samples stored'''
+        return self.add_values(node, endpoint, [r['value'] for r in api_response['data']], timestamp)
+
+    '''Add Pin Values Function'''
+    def add_values(self, node, endpoint, values, timestamp=None):
+        '''Append one reading of every pin given as a plain list'''
+        if endpoint not in MEASUREMENTS:
+            return 0
+        timestamp = timestamp or time.time_ns()
+        for pin, value in enumerate(values):
+            self.segment(node, endpoint, pin).append(timestamp, float(value))
+        return len(values)
+
+    '''Read Samples Function'''
+    def read(self, node, endpoint, pin, last=None):
+        '''Return zero-copy record chunks of the newest samples of one channel'''
+        segment = self.segment(node, endpoint, pin)
+        with segment.lock:
+            end = segment.written
+            return segment.chunks(end - (last or segment.capacity), end)
+
+    '''Export Channel Function'''
+    def export(self, node, endpoint, pin, f, last=None):
+        '''Write raw little-endian (int64 ns, float64) records to a binary file object'''
+        written = 0
+        for chunk in self.read(node, endpoint, pin, last):
+            f.write(chunk)
+            written += len(chunk) // RECORD_SIZE
+        return written
+
+    '''Replay Into Database Function'''
+    def replay(self):
+        '''The cursor of a segment only moves past samples InfluxDB acknowledged, the rest are retried next interval'''
+        if not self.writer or not self.writer.healthy():
+            return 0
+        replayed = 0
+        with self.lock:
+            segments = list(self.segments.items())
+        for (node, endpoint, pin), segment in segments:
+            if not self.writer.healthy():
+                break
+            chunks, cursor, lost = segment.pending(self.replay_batch)
+            position = cursor - sum(len(chunk) for chunk in chunks) // RECORD_SIZE
+            self.points_lost += lost
+            failed = False
+            for chunk in chunks:
+                written = self.writer.write_points(node, endpoint, pin, chunk.cast('q')[0::2], chunk.cast('d')[1::2])
+                position += written
+                replayed += written
+                if written < len(chunk) // RECORD_SIZE:
+                    failed = True
+                    break
+            segment.advance(position)
+            if failed:
+                break
+        self.points_replayed += replayed
+        return replayed
+
+    '''Replay Thread Function'''
+    def replay_loop(self):
+        while not self.stop_event.wait(self.replay_interval):
+            try:
+                self.replay()
+            except Exception as e:
+                my_logger.error('### Unexpected Sample Replay Error Occured ###')
+                my_logger.error(e)
+
+    '''Start Replay Function'''
+    def start(self):
+        if self.writer and self.writer.enabled and self.replayer is None:
+            self.replayer = threading.Thread(target=self.replay_loop, name='RemoteDAQ_Replay', daemon=True)
+            self.replayer.start()
+
+    '''Close Store Function'''
+    def close(self):
+        self.stop_event.set()
+        with self.lock:
+            segments = list(self.segments.values())
+            self.segments.clear()
+        for segment in segments:
+            segment.close()
+
+    '''Store Stats Function'''
+    def stats(self):
+        with self.lock:
+            segments = list(self.segments.values())
+        return {
+            'segments': len(segments),
+            'samples_written': sum(s.written for s in segments),
+            'samples_pending': sum(min(s.written - s.replayed, s.capacity) for s in segments),
+            'points_replayed': self.points_replayed,
+            'points_lost': self.points_lost,
+        }
+
+    '''Metrics Collector Function'''
+    def collect(self):
+        stats = self.stats()
+        return [
+            ('remotedaq_queue_depth', 'Work waiting in server queues', {'queue': 'store_replay'}, stats['samples_pending']),
+            ('remotedaq_store_segments', 'Open sample ring segments', {}, stats['segments']),
+            ('remotedaq_store_points_lost', 'Samples overwritten before they were replayed', {}, stats['points_lost']),
+        ]
+
+'''Shared Store Instance'''
+_store = None
+_store_lock = threading.Lock()
+
+def get_store(writer=None) -> sample_store:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = sample_store(
+                root=getenv('STORE_DIR', 'data/samples'),
+                capacity=int(getenv('STORE_CAPACITY', 1 << 20)),
+                writer=writer,
+            )
+            _store.start()
+            atexit.register(_store.close)
+            remoteDAQ_Metrics.get_registry().collector(_store.collect)
+        return _store
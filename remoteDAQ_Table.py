@@ -0,0 +1,105 @@
+import flet as ft
+from remoteDAQ_Cache import isOnline, node_health
+
+'''Result Table Class'''
+class result_table(ft.DataTable):
+    def __init__(self, row_headers=0, col_headers=['Pin', 'Value']):
+        self.col_headers = col_headers
+        self.row_headers = row_headers
+        super().__init__(
+            border=ft.border.all(1, ft.colors.BLACK),
+            border_radius=10,
+            vertical_lines=ft.border.BorderSide(1, ft.colors.BLACK),
+            horizontal_lines=ft.border.BorderSide(1, ft.colors.BLACK38),
+            show_checkbox_column=True,
+            columns=[
+                ft.DataColumn(ft.Text(i)) for i in self.col_headers
+            ],
+            rows=[
+                ft.DataRow(
+                    [ft.DataCell(ft.Text('')) for _ in range(len(self.col_headers))],
+                    on_select_changed=self.cell_selected,
+                ) for _ in range(0, self.row_headers)
+            ]
+        )
+        for i in range(0, self.row_headers):
+            self.rows[i].cells[0].content.value = str(i)
+
+    '''Result Table Checkbox Function'''
+    def cell_selected(self, e):
+        e.control.selected = not e.control.selected
+        self.update()
+
+'''Node Status Table Class'''
+class status_table(result_table):
+    def __init__(self, client):
+        super().__init__(col_headers=['ID', 'Name', 'IP Address', 'Authorized', 'Online', 'Health'])
+        self.client = client
+        self.node_rows = {}
+
+    '''Health Colors'''
+    HEALTH_COLORS = {
+        'Healthy': ft.colors.GREEN,
+        'Degraded': ft.colors.AMBER,
+        'Unreachable': ft.colors.RED,
+        'Offline': ft.colors.GREY,
+    }
+
+    '''Health Text Function'''
+    def health_text(self, cell, value):
+        cell.content.value = value
+        cell.content.color = self.HEALTH_COLORS.get(value, ft.colors.BLACK54)
+
+    '''Status Icon Function'''
+    def status_icon(self, cell, value):
+        icon = cell.content.content
+        icon.name = ft.icons.CHECK_CIRCLE if value else ft.icons.ERROR
+        icon.color = ft.colors.GREEN if value else ft.colors.RED
+
+    '''Sync Node Rows Function'''
+    def sync(self, nodes):
+        '''Patch rows in place keyed by nodeId, return True if anything changed'''
+        changed = False
+        seen = set()
+        for n in nodes:
+            node_id = n['nodeId']
+            seen.add(node_id)
+            node_ip = n['config']['ipAssignments'][0] if n['config']['ipAssignments'] else ''
+            state = (n['name'], node_ip, bool(n['config']['authorized']), isOnline(n['lastSeen']), node_health(n, self.client))
+            if node_id not in self.node_rows:
+                row = ft.DataRow(
+                    [
+                        ft.DataCell(ft.Text(node_id, selectable=True)),
+                        ft.DataCell(ft.Text(state[0], selectable=True)),
+                        ft.DataCell(ft.Text(state[1], selectable=True)),
+                        ft.DataCell(ft.Container(ft.Icon(), alignment=ft.alignment.center)),
+                        ft.DataCell(ft.Container(ft.Icon(), alignment=ft.alignment.center)),
+                        ft.DataCell(ft.Text('', weight=ft.FontWeight.BOLD)),
+                    ]
+                )
+                self.status_icon(row.cells[3], state[2])
+                self.status_icon(row.cells[4], state[3])
+                self.health_text(row.cells[5], state[4])
+                self.rows.append(row)
+                self.node_rows[node_id] = [row, state]
+                changed = True
+                continue
+            row, old_state = self.node_rows[node_id]
+            if state == old_state:
+                continue
+            if state[0] != old_state[0]:
+                row.cells[1].content.value = state[0]
+            if state[1] != old_state[1]:
+                row.cells[2].content.value = state[1]
+            if state[2] != old_state[2]:
+                self.status_icon(row.cells[3], state[2])
+            if state[3] != old_state[3]:
+                self.status_icon(row.cells[4], state[3])
+            if state[4] != old_state[4]:
+                self.health_text(row.cells[5], state[4])
+            self.node_rows[node_id][1] = state
+            changed = True
+        for node_id in [i for i in self.node_rows if i not in seen]:
+            self.rows.remove(self.node_rows.pop(node_id)[0])
+            changed = True
+        return changed
@@ -0,0 +1,61 @@
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from os import getenv
+
+'''Logger Config'''
+my_logger = logging.getLogger('RemoteDAQ_Server')
+
+'''Supervisor Mode Function'''
+def supervisor_mode():
+    '''True in the parent process when UI_WORKERS asks for more than one worker'''
+    return int(getenv('UI_WORKERS', 1)) > 1 and getenv('WORKER_INDEX') is None
+
+'''Worker Environment Function'''
+def worker_env(index):
+    '''Each worker gets its own UI and metrics port and sample store, and a state backend shared with the others'''
+    backend = getenv('STATE_BACKEND', 'memory')
+    metrics_port = int(getenv('METRICS_PORT', 9464))
+    return dict(
+        os.environ,
+        WORKER_INDEX=str(index),
+        UI_PORT=str(int(getenv('UI_PORT', 2023)) + index),
+        METRICS_PORT=str(metrics_port + index if metrics_port else 0),
+        STORE_DIR=os.path.join(getenv('STORE_DIR', 'data/samples'), 'worker-{}'.format(index)),
+        STATE_BACKEND='sqlite' if backend == 'memory' else backend,
+    )
+
+'''Worker Supervisor Function'''
+def supervise(command=None, restart_delay=2.0):
+    '''Start UI_WORKERS copies of command, restart any that exit and stop them all on SIGTERM'''
+    workers = int(getenv('UI_WORKERS', 1))
+    command = command or [sys.executable] + sys.argv
+    if getenv('STATE_BACKEND', 'memory') == 'memory':
+        my_logger.warning('### STATE_BACKEND=memory cannot be shared between workers, using sqlite ###')
+    stopping = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *args: stopping.set())
+    processes = {}
+    for index in range(workers):
+        processes[index] = subprocess.Popen(command, env=worker_env(index))
+        my_logger.info('Worker {} started on port {}, pid {}'.format(index, worker_env(index)['UI_PORT'], processes[index].pid))
+    while not stopping.wait(1):
+        for index, process in list(processes.items()):
+            if process.poll() is None:
+                continue
+            my_logger.error('### Worker {} Exited With Code {}, Restarting ###'.format(index, process.returncode))
+            time.sleep(restart_delay)
+            processes[index] = subprocess.Popen(command, env=worker_env(index))
+    for process in processes.values():
+        process.terminate()
+    deadline = time.monotonic() + 10
+    for process in processes.values():
+        try:
+            process.wait(max(deadline - time.monotonic(), 0))
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return 0